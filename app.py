@@ -1,12 +1,28 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 import os
 from dotenv import load_dotenv
 from src.rag import graph
+from src.sessions import session_graph, start_session
+from src.shards import parse_era
+from src.single_flight import SingleFlight
+from src.metrics import CONTENT_TYPE, render_metrics
+from src.profiling import PROFILE_MODE, ContinuousProfiler, profile_invoke, profiling_requested, write_profile
 
 load_dotenv()
 
 app = Flask(__name__)
 
+# Identical questions asked at the same time share one graph run
+rag_graph = SingleFlight(graph)
+
+# TRAVELLM_PROFILE=continuous keeps a low-rate sampler running (e.g. on staging).
+# `python app.py` runs the debug reloader, which imports this module in a file
+# watcher and again in the process that serves requests (WERKZEUG_RUN_MAIN set);
+# only the latter is profiled. Imported by a WSGI server, it always starts.
+serving_process = __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+if PROFILE_MODE == "continuous" and serving_process:
+    continuous_profiler = ContinuousProfiler().start()
+
 @app.route('/')
 def home():
     return '''
@@ -104,6 +120,9 @@ def home():
         </div>
 
         <script>
+            // The server opens a session with the first answer; follow-ups send its id back
+            let sessionId = null;
+
             document.getElementById('questionForm').addEventListener('submit', async function(e) {
                 e.preventDefault();
                 
@@ -123,12 +142,13 @@ def home():
                         headers: {
                             'Content-Type': 'application/json',
                         },
-                        body: JSON.stringify({ question: question })
+                        body: JSON.stringify(sessionId ? { question: question, session_id: sessionId } : { question: question })
                     });
                     
                     const data = await response.json();
                     
                     if (data.success) {
+                        sessionId = data.session_id || sessionId;
                         responseDiv.innerHTML = '<div class="response">' + data.response + '</div>';
                     } else {
                         responseDiv.innerHTML = '<div class="response" style="border-left-color: #dc3545; color: #dc3545;">Error: ' + data.error + '</div>';
@@ -154,15 +174,50 @@ def ask():
         if not question:
             return jsonify({'success': False, 'error': 'Please provide a question'})
         
-        # Use your existing RAG graph
-        result = graph.invoke({"question": question})
-        response = result["response"]
-        
-        return jsonify({'success': True, 'response': response})
+        # Optional era ("1861", "1860s", "1861-1865"); otherwise inferred from the question
+        inputs = {"question": question}
+        era = (data.get('era') or '').strip()
+        if era:
+            parse_era(era)
+            inputs["era"] = era
+
+        # Follow-ups send back the session_id returned with the first answer and
+        # reuse the context retrieved earlier in the session. First questions
+        # run the coalesced graph and only then open a session from its result.
+        session_id = data.get('session_id')
+        if session_id:
+            runnable, config = session_graph, {"configurable": {"thread_id": str(session_id)}}
+        else:
+            runnable, config = rag_graph, None
+
+        # Profiled requests (X-Profile: $PROFILE_TOKEN or TRAVELLM_PROFILE=1) run on
+        # their own, not coalesced, so the profile covers exactly this request.
+        # The response only carries timings; stacks stay in profiles/ on the server.
+        report = None
+        if profiling_requested(request.headers):
+            result, full_report = profile_invoke(graph if runnable is rag_graph else runnable, inputs, config)
+            collapsed_path = write_profile(full_report)
+            report = {key: full_report[key] for key in ("id", "wall_time_s", "samples", "nodes", "steps")}
+            report["file"] = os.path.basename(collapsed_path)
+        else:
+            result = runnable.invoke(inputs, config=config)
+
+        if not session_id:
+            session_id = start_session(result, inputs.get("era"))
+
+        body = {'success': True, 'response': result["response"], 'session_id': session_id}
+        if report is not None:
+            body['profile'] = report
+        return jsonify(body)
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/metrics')
+def metrics():
+    # Prometheus scrape endpoint: per-node/step latency, tokens, cost, cache hits, errors
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     print("🚀 Starting Time Travel LLM - 1861")
     print("📖 Make sure you have your OpenAI API key in a .env file")
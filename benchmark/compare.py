@@ -0,0 +1,39 @@
+import argparse
+import json
+
+
+def load_results(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, candidate: dict, percentiles=("p50", "p95", "p99")):
+    """Print per-stage latency percentiles of two benchmark runs side by side"""
+    print(f"baseline {baseline['commit']} ({baseline['timestamp']}) vs candidate {candidate['commit']} ({candidate['timestamp']})")
+    print(f"{'stage (ms)':<40} {'pct':>4} {'base':>9} {'new':>9} {'change':>8}")
+
+    stages = {"end_to_end": (baseline["end_to_end"], candidate["end_to_end"])}
+    for name in sorted(set(baseline["stages"]) | set(candidate["stages"])):
+        stages[name] = (baseline["stages"].get(name, {}), candidate["stages"].get(name, {}))
+
+    for name, (base, new) in stages.items():
+        for pct in percentiles:
+            if pct not in base or pct not in new:
+                print(f"{name:<40} {pct:>4} {'-':>9} {'-':>9} {'-':>8}")
+                continue
+            change = (new[pct] - base[pct]) / base[pct] * 100 if base[pct] else 0.0
+            print(f"{name:<40} {pct:>4} {base[pct] * 1000:>9.1f} {new[pct] * 1000:>9.1f} {change:>+7.1f}%")
+
+    base_qps, new_qps = baseline["throughput_qps"], candidate["throughput_qps"]
+    change = (new_qps - base_qps) / base_qps * 100 if base_qps else 0.0
+    print(f"throughput: {base_qps:.2f} -> {new_qps:.2f} q/s ({change:+.1f}%)")
+    print(f"max rss: {baseline['peak_memory_mb']['max_rss']:.1f} -> {candidate['peak_memory_mb']['max_rss']:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+
+    compare(load_results(args.baseline), load_results(args.candidate))
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+WORD_RE = re.compile(r"[a-z]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "did", "do", "for", "from",
+    "how", "i", "in", "is", "it", "of", "on", "or", "the", "to", "was", "what", "when",
+    "where", "which", "who", "why", "with", "according", "about", "that", "this",
+}
+
+
+def _keywords(text: str) -> List[str]:
+    return [word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:8]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for ChatOpenAI.
+
+    Sleeps for a fixed latency and answers from the prompt text alone, so the
+    same question always produces the same output. Recognises the three prompts
+    the graph sends: the MultiQueryRetriever rewrite, the LOC planner (tool
+    call) and the generator.
+    """
+
+    model_name: str = "fake-chat"
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        prompt = "\n".join(str(message.content) for message in messages)
+        tools = kwargs.get("tools")
+
+        if tools:
+            question = prompt.split("Question:", 1)[-1].split("\n", 1)[0]
+            message = AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": tools[0]["function"]["name"],
+                    "args": {"query": _keywords(question)[:3] or ["news"]},
+                    "id": f"call_{_digest(prompt)}",
+                }],
+            )
+        elif "Original question:" in prompt:
+            question = prompt.split("Original question:", 1)[-1].strip()
+            keywords = " ".join(_keywords(question))
+            message = AIMessage(content=f"{question}\nWhat did the papers say about {keywords}?\n{keywords} news 1861")
+        else:
+            question = prompt.rsplit("# QUERY:", 1)[-1].strip()
+            message = AIMessage(content=f"I reckon folks here talk of {' '.join(_keywords(question)) or 'little else'}. ({_digest(prompt)})")
+
+        input_tokens = len(prompt.split())
+        output_tokens = len(str(message.content).split())
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        message.response_metadata = {"model_name": self.model_name}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic hashed bag-of-words embeddings with a fixed latency per call.
+
+    Texts sharing words land close together, so vector search still returns
+    sensible neighbours without calling OpenAI.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in WORD_RE.findall(text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % self.size] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._embed(text)
+
+
+class LOCStubServer:
+    """
+    Local stand-in for the Chronicling America search API.
+
+    Answers every GET with a deterministic page of results derived from the
+    `qs` query parameter, after a fixed latency. Use as a context manager and
+    point LOC_BASE_URL at `url`.
+    """
+
+    def __init__(self, latency: float = 0.0, results: int = 10):
+        latency_, results_ = latency, results
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency_)
+                query = parse_qs(urlparse(self.path).query).get("qs", [""])[0]
+                body = json.dumps({"results": [
+                    {
+                        "title": f"The Stub Gazette ({query}) no. {i}",
+                        "date": f"1861-0{1 + i % 9}-1{i % 10}",
+                        "description": [f"Dispatch concerning {query.replace('+', ' ')}, item {i}."],
+                        "url": f"https://example.invalid/loc/{_digest(query)}/{i}",
+                    }
+                    for i in range(results_)
+                ]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmark.fakes import FakeChatModel, FakeEmbeddings, LOCStubServer
+from src import models
+from src.metrics import NODE_LATENCY, STEP_LATENCY
+
+DATASET_PATH = os.path.join(ROOT, "data", "synthetic_dataset.json")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def summarize(samples: list) -> dict:
+    """Nearest-rank p50/p95/p99 and mean of latency samples, in seconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+    }
+
+
+def install_fakes(llm_latency: float, embedding_latency: float):
+    """Point src.models at deterministic stand-ins and an in-memory vector store"""
+    from langchain_core.vectorstores import InMemoryVectorStore
+    from src.corpus import load_and_chunk_documents
+
+    embeddings = FakeEmbeddings(latency=embedding_latency)
+    store = InMemoryVectorStore(embedding=embeddings)
+    store.add_documents(load_and_chunk_documents())
+
+    models.configure(
+        chat=lambda model, **kwargs: FakeChatModel(model_name=f"fake-{model}", latency=llm_latency),
+        embeddings=lambda model: embeddings,
+        vectorstore=lambda collection_name, embeddings=None: store,
+    )
+
+
+def load_questions(path: str, limit: int = None, repeat: int = 1) -> list:
+    with open(path, "r") as f:
+        questions = [row["user_input"] for row in json.load(f)]
+    if limit:
+        questions = questions[:limit]
+    return questions * repeat
+
+
+def run_benchmark(questions: list, concurrency: int, warmup: int = 1, trace_memory: bool = False) -> dict:
+    """
+    Replay questions through the real graph and collect latency statistics.
+
+    Per-stage samples come from the node and sub-step histograms in
+    src/metrics.py, so the stages reported here are the same ones /metrics
+    exposes in production.
+    """
+    from src.rag import graph
+
+    for question in questions[:warmup]:
+        graph.invoke({"question": question})
+
+    stages = defaultdict(list)
+    lock = threading.Lock()
+
+    def record(name, value):
+        with lock:
+            stages[name].append(value)
+
+    NODE_LATENCY.subscribe(lambda value, labels: record(labels["node"], value))
+    STEP_LATENCY.subscribe(lambda value, labels: record(f"{labels['node']}/{labels['step']}", value))
+
+    def run_one(question):
+        start = time.perf_counter()
+        try:
+            graph.invoke({"question": question})
+        except Exception as e:
+            print(f"Error on {question!r}: {e}")
+            return None
+        return time.perf_counter() - start
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(run_one, questions))
+    wall_time = time.perf_counter() - start
+    traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+
+    completed = [latency for latency in latencies if latency is not None]
+    return {
+        "end_to_end": summarize(completed),
+        "stages": {name: summarize(samples) for name, samples in sorted(stages.items())},
+        "throughput_qps": len(completed) / wall_time if wall_time else 0.0,
+        "wall_time_s": wall_time,
+        "errors": len(latencies) - len(completed),
+        "peak_memory_mb": {
+            # ru_maxrss is KiB on Linux
+            "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "python_traced": traced_peak / 1024 / 1024 if traced_peak is not None else None,
+        },
+    }
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(results: dict, output_dir: str = RESULTS_DIR) -> str:
+    """Save benchmark results to a timestamped JSON file"""
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = os.path.join(output_dir, f"benchmark_{results['commit']}_{timestamp}.json")
+    with open(filename, "w") as f:
+        json.dump(results, f, indent=2)
+    return filename
+
+
+def print_report(results: dict):
+    def row(name, stats):
+        if not stats.get("count"):
+            return f"{name:<40} {'-':>8}"
+        return f"{name:<40} {stats['p50'] * 1000:>8.1f} {stats['p95'] * 1000:>8.1f} {stats['p99'] * 1000:>8.1f} {stats['count']:>6}"
+
+    print(f"{'stage (ms)':<40} {'p50':>8} {'p95':>8} {'p99':>8} {'n':>6}")
+    print(row("end_to_end", results["end_to_end"]))
+    for name, stats in results["stages"].items():
+        print(row(name, stats))
+    print(f"throughput: {results['throughput_qps']:.2f} q/s, errors: {results['errors']}")
+    print(f"peak memory: {results['peak_memory_mb']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the RAG graph")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--limit", type=int, default=None, help="Only replay the first N questions")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the question list this many times")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per fake chat call")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="Seconds per fake embedding call")
+    parser.add_argument("--loc-latency", type=float, default=0.1, help="Seconds per stub LOC request")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report tracemalloc peak (slower)")
+    parser.add_argument("--output-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    install_fakes(args.llm_latency, args.embedding_latency)
+    questions = load_questions(args.dataset, args.limit, args.repeat)
+
+    with LOCStubServer(latency=args.loc_latency) as loc_server:
+        os.environ["LOC_BASE_URL"] = loc_server.url
+        results = run_benchmark(questions, args.concurrency, args.warmup, args.trace_memory)
+
+    results = {
+        "commit": current_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        **results,
+    }
+    print_report(results)
+    filename = save_results(results, args.output_dir)
+    print(f"Results saved to: {filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,16 @@ import json
 
 from datasets import load_dataset
 
-YEAR = "1861"
+# Each year is saved to its own directory; embed_articles.py shards by year
+YEARS = ["1861"]
 MAX_ARTICLES = 1000
 
-#  Download data for the year 1861 at the associated article level (Default)
+#  Download data for the selected years at the associated article level (Default)
 dataset = load_dataset("dell-research-harvard/AmericanStories",
     "subset_years",
-    year_list=[YEAR]
+    year_list=YEARS
 )
 
-articles = dataset[YEAR]
-
 def save_articles_to_directory(articles, output_dir="data/articles_1861", max_articles=None):
     """Save articles to individual JSON files in the specified directory."""
     os.makedirs(output_dir, exist_ok=True)
@@ -29,5 +28,6 @@ def save_articles_to_directory(articles, output_dir="data/articles_1861", max_ar
     
     print(f"Saved {len(articles) if max_articles is None else max_articles} articles to {output_dir}")
 
-# Save all articles to directory
-save_articles_to_directory(articles, output_dir=f"data/articles_{YEAR}_sample", max_articles=MAX_ARTICLES)
\ No newline at end of file
+# Save each year's articles to its own directory
+for year in YEARS:
+    save_articles_to_directory(dataset[year], output_dir=f"data/articles_{year}_sample", max_articles=MAX_ARTICLES)
\ No newline at end of file
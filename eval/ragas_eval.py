@@ -1,11 +1,12 @@
+import argparse
 import json
 import os
 import sys
 from datetime import datetime
 
 import pandas as pd
-from langchain_openai import ChatOpenAI
 from ragas import EvaluationDataset, evaluate, RunConfig
+from ragas.embeddings import LangchainEmbeddingsWrapper
 from ragas.llms import LangchainLLMWrapper
 from ragas.metrics import (
     Faithfulness,
@@ -16,7 +17,12 @@ from ragas.metrics import (
 
 # Add parent directory to path for local imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.models import chat_model, embedding_model
 from src.rag import graph
+from src.rate_limit import set_default_priority
+from src.retrievers import DEFAULT_RETRIEVER, RETRIEVER_FACTORIES
+
+CHECKPOINT_DIR = "ragas_results/checkpoints"
 
 
 def load_synthetic_data(filepath: str) -> list:
@@ -38,26 +44,103 @@ def create_evaluation_dataset(synthetic_data: list) -> list:
     return eval_dataset
 
 
-def process_responses(eval_dataset: list) -> list:
-    """Process RAG responses for each evaluation sample."""
-    print("Processing responses...")
+def load_checkpoint(checkpoint_path: str, retriever: str = None) -> dict:
+    """Load completed responses from an append-only JSONL checkpoint, keyed by dataset index.
+
+    Args:
+        checkpoint_path: JSONL file written by process_responses
+        retriever: If given, skip rows produced by a different retriever
+    """
+    completed = {}
+    if not os.path.exists(checkpoint_path):
+        return completed
+    with open(checkpoint_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a partial last line
+                continue
+            if retriever is not None and record.get("retriever") != retriever:
+                continue
+            completed[record["index"]] = record
+    return completed
+
+
+def process_responses(
+    eval_dataset: list,
+    retriever: str = DEFAULT_RETRIEVER,
+    max_concurrency: int = 4,
+    checkpoint_path: str = None,
+) -> list:
+    """
+    Process RAG responses for each evaluation sample.
+
+    Questions run concurrently through the graph, and every finished response is
+    appended to a JSONL checkpoint as soon as it completes. Rerunning with the
+    same checkpoint only executes the questions that are still missing.
+
+    Args:
+        eval_dataset: Rows from create_evaluation_dataset
+        retriever: Name of the retriever retrieve_local should use
+        max_concurrency: Maximum number of graph runs in flight at once
+        checkpoint_path: JSONL file of completed responses (defaults to one per retriever)
+    """
+    if checkpoint_path is None:
+        checkpoint_path = os.path.join(CHECKPOINT_DIR, f"{retriever}_responses.jsonl")
+    os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+
+    # Only trust checkpoint rows from this retriever that still match the
+    # dataset's question, so a shared --checkpoint can't mix retrievers
+    completed = load_checkpoint(checkpoint_path, retriever)
+    pending = [
+        i for i, row in enumerate(eval_dataset)
+        if completed.get(i, {}).get("question") != row["question"]
+    ]
     total = len(eval_dataset)
-    for i, test_row in enumerate(eval_dataset, 1):
-        response = graph.invoke({"question": test_row["question"]})
-        test_row["response"] = response["response"]
-        test_row["retrieved_contexts"] = [
-            context.page_content for context in response["local_context"]
-        ]
+    print(f"Processing responses with {retriever!r} retriever: {total - len(pending)}/{total} already in {checkpoint_path}")
+
+    config = {"max_concurrency": max_concurrency, "configurable": {"retriever": retriever}}
+    inputs = [{"question": eval_dataset[i]["question"]} for i in pending]
+    failures = 0
+    with open(checkpoint_path, "a") as checkpoint:
+        for position, response in graph.batch_as_completed(inputs, config, return_exceptions=True):
+            index = pending[position]
+            if isinstance(response, Exception):
+                failures += 1
+                print(f"Question {index} failed, will retry on the next run: {response}")
+                continue
+            record = {
+                "index": index,
+                "question": eval_dataset[index]["question"],
+                "retriever": retriever,
+                "response": response["response"],
+                "retrieved_contexts": [context.page_content for context in response["local_context"]],
+            }
+            checkpoint.write(json.dumps(record) + "\n")
+            checkpoint.flush()
+            completed[index] = record
+            if len(completed) % 5 == 0:
+                print(f"Ran {len(completed)}/{total}...")
+
+    if failures:
+        raise RuntimeError(f"{failures} questions failed; rerun to resume from {checkpoint_path}")
+
+    for i, test_row in enumerate(eval_dataset):
+        test_row["response"] = completed[i]["response"]
+        test_row["retrieved_contexts"] = completed[i]["retrieved_contexts"]
         test_row["user_input"] = test_row["question"]
         test_row["reference"] = test_row["ground_truth"]
-        if i % 5 == 0:
-            print(f"Ran {i}/{total}...")
     return eval_dataset
 
 
 def run_evaluation(evaluation_dataset: EvaluationDataset) -> pd.DataFrame:
     """Run RAGAS evaluation with specified metrics."""
-    evaluator_llm = LangchainLLMWrapper(ChatOpenAI(model="gpt-4o-mini"))
+    evaluator_llm = LangchainLLMWrapper(chat_model("gpt-4o-mini"))
+    evaluator_embeddings = LangchainEmbeddingsWrapper(embedding_model())
     custom_run_config = RunConfig(timeout=360)
     
     result = evaluate(
@@ -69,23 +152,33 @@ def run_evaluation(evaluation_dataset: EvaluationDataset) -> pd.DataFrame:
             LLMContextRecall(),
         ],
         llm=evaluator_llm,
+        embeddings=evaluator_embeddings,
         run_config=custom_run_config,
     )
     
     return result.to_pandas()
 
 
-def save_results(results_df: pd.DataFrame, output_dir: str = "ragas_results") -> str:
+def save_results(results_df: pd.DataFrame, output_dir: str = "ragas_results", prefix: str = "") -> str:
     """Save evaluation results to CSV file with timestamp."""
     os.makedirs(output_dir, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{output_dir}/ragas_results_{timestamp}.csv"
+    filename = f"{output_dir}/{prefix}ragas_results_{timestamp}.csv"
     results_df.to_csv(filename, index=False)
     return filename
 
 
 def main():
     """Main evaluation pipeline."""
+    parser = argparse.ArgumentParser(description="Run the RAG graph over the synthetic dataset and score it with RAGAS")
+    parser.add_argument("--retriever", default=DEFAULT_RETRIEVER, choices=sorted(RETRIEVER_FACTORIES))
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum graph runs in flight at once")
+    parser.add_argument("--checkpoint", default=None, help="JSONL checkpoint of generated responses to resume from")
+    args = parser.parse_args()
+
+    # Evals run behind live traffic in the shared OpenAI rate limiter
+    set_default_priority("eval")
+
     # Load synthetic dataset
     synthetic_data = load_synthetic_data("../data/synthetic_dataset.json")
     
@@ -93,7 +186,7 @@ def main():
     eval_dataset = create_evaluation_dataset(synthetic_data)
     
     # Process RAG responses
-    eval_dataset = process_responses(eval_dataset)
+    eval_dataset = process_responses(eval_dataset, args.retriever, args.concurrency, args.checkpoint)
     
     # Create RAGAS evaluation dataset
     evaluation_dataset = EvaluationDataset.from_list(eval_dataset)
@@ -102,7 +195,7 @@ def main():
     results_df = run_evaluation(evaluation_dataset)
     
     # Save results
-    filename = save_results(results_df)
+    filename = save_results(results_df, prefix=f"{args.retriever}_")
     print(f"Results saved to: {filename}")
 
 
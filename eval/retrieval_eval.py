@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+# Add parent directory to path for local imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark.run import install_fakes, summarize
+from src.ocr_normalize import NORMALIZE_OCR
+from src.rate_limit import set_default_priority
+from src.retrievers import DEFAULT_RETRIEVER, RETRIEVER_FACTORIES, get_retriever, register_retriever
+
+DATASET_PATH = "../data/synthetic_dataset.json"
+
+
+def load_synthetic_data(filepath: str) -> list:
+    """Load synthetic dataset from JSON file."""
+    with open(filepath, "r") as f:
+        return json.load(f)
+
+
+# token_set_ratio scores how much of the smaller text's vocabulary appears in
+# the larger one, so a chunk that contains a reference context (or is contained
+# in it) scores ~100 regardless of chunk boundaries. partial_ratio aligns raw
+# substrings instead: slightly stricter, but much slower on 750-token chunks.
+SCORERS = {
+    "token_set": fuzz.token_set_ratio,
+    "partial": fuzz.partial_ratio,
+}
+
+
+def match_matrix(retrieved: list, references: list, threshold: float, scorer: str = "token_set") -> np.ndarray:
+    """
+    Boolean (retrieved x references) matrix of which retrieved chunk covers
+    which reference context, scored in parallel by rapidfuzz.
+    """
+    if not retrieved or not references:
+        return np.zeros((len(retrieved), len(references)), dtype=bool)
+    scores = process.cdist(
+        retrieved, references, scorer=SCORERS[scorer], score_cutoff=threshold, workers=-1
+    )
+    return scores >= threshold
+
+
+def normalize_references(dataset: list) -> list:
+    """
+    Run reference_contexts (raw OCR text) through the same OCR normalization
+    as the indexed chunks, so fuzzy matching compares like with like.
+    """
+    from src.corpus import load_articles
+    from src.ocr_normalize import corpus_corrections, normalize_text
+
+    corrections = corpus_corrections([article.page_content for article in load_articles()])
+    for item in dataset:
+        item["reference_contexts"] = [normalize_text(context, corrections) for context in item["reference_contexts"]]
+    return dataset
+
+
+def score_ranking(matches: np.ndarray, cutoffs: list) -> dict:
+    """recall@k, nDCG@k and reciprocal rank for one ranked list of retrieved chunks"""
+    n_references = matches.shape[1]
+    relevant = matches.any(axis=1)
+    # Graded gain: each chunk earns one unit per reference it is the first to
+    # cover. Reprints or repeated matches of a covered reference add nothing,
+    # and a chunk covering two references counts twice, in line with recall.
+    covered_before = np.zeros_like(matches)
+    if len(matches) > 1:
+        covered_before[1:] = np.logical_or.accumulate(matches, axis=0)[:-1]
+    gains = (matches & ~covered_before).sum(axis=1)
+    discounts = 1.0 / np.log2(np.arange(2, len(gains) + 2))
+
+    scores = {}
+    hits = np.flatnonzero(relevant)
+    scores["mrr"] = 1.0 / (hits[0] + 1) if len(hits) else 0.0
+    for k in cutoffs:
+        top = matches[:k]
+        scores[f"recall@{k}"] = top.any(axis=0).sum() / n_references if n_references else 0.0
+        dcg = float((gains[:k] * discounts[:k]).sum())
+        # The best ordering of the same chunks puts the largest gains first
+        ideal = float((np.sort(gains)[::-1][:k] * discounts[:k]).sum())
+        scores[f"ndcg@{k}"] = dcg / ideal if ideal else 0.0
+    return scores
+
+
+def evaluate_retriever(name: str, dataset: list, cutoffs: list, threshold: float, scorer: str = "token_set") -> dict:
+    """Run one retriever over every question and average its ranking metrics."""
+    # Same over-fetch and reprint collapse as the app's retrieve_local, so the
+    # scores describe what the generator actually sees
+    from src.rag import search_local
+
+    latencies = []
+    rows = []
+    for item in dataset:
+        start = time.perf_counter()
+        documents = search_local(item["user_input"], name)
+        latencies.append(time.perf_counter() - start)
+
+        matches = match_matrix(
+            [document.page_content for document in documents], item["reference_contexts"], threshold, scorer
+        )
+        rows.append(score_ranking(matches, cutoffs))
+
+    result = {"retriever": name}
+    result.update(pd.DataFrame(rows).mean().to_dict())
+    latency = summarize(latencies)
+    result.update({f"latency_{key}_ms": latency[key] * 1000 for key in ("p50", "p95", "p99")})
+    return result
+
+
+def register_variants(chunk_sizes: list, weights: list):
+    """Register BM25 chunk-size and ensemble fusion-weight variants to compare."""
+    from langchain.retrievers import EnsembleRetriever
+    from langchain_community.retrievers import BM25Retriever
+    from src.corpus import chunk_documents, load_articles
+    from src.ocr_normalize import normalize_documents, tokenize
+
+    for chunk_size in chunk_sizes:
+        register_retriever(
+            f"bm25@{chunk_size}",
+            lambda chunk_size=chunk_size: BM25Retriever.from_documents(
+                chunk_documents(
+                    normalize_documents(load_articles()) if NORMALIZE_OCR else load_articles(), chunk_size=chunk_size
+                ),
+                preprocess_func=tokenize,
+            ),
+        )
+    if weights:
+        register_retriever(
+            f"ensemble@{weights[0]}/{weights[1]}",
+            lambda: EnsembleRetriever(retrievers=get_retriever("ensemble").retrievers, weights=weights),
+        )
+
+
+def save_results(results_df: pd.DataFrame, output_dir: str = "ragas_results") -> str:
+    """Save retrieval results to CSV file with timestamp."""
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{output_dir}/retrieval_results_{timestamp}.csv"
+    results_df.to_csv(filename, index=False)
+    return filename
+
+
+def main():
+    """Score retrievers against reference_contexts without generating answers or LLM judges."""
+    parser = argparse.ArgumentParser(description="Retrieval-only evaluation: recall@k, MRR, nDCG and latency")
+    parser.add_argument("--retriever", nargs="+", default=[DEFAULT_RETRIEVER], help=f"Any of {sorted(RETRIEVER_FACTORIES)}")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="Cutoffs for recall@k and nDCG@k")
+    parser.add_argument("--threshold", type=float, default=80.0, help="Minimum score (0-100) for a chunk to match a reference context")
+    parser.add_argument("--scorer", default="token_set", choices=sorted(SCORERS), help="rapidfuzz scorer used to match chunks to reference contexts")
+    parser.add_argument("--chunk-size", type=int, nargs="*", default=[], help="Also score BM25 built with these chunk sizes")
+    parser.add_argument("--weights", type=float, nargs=2, default=None, help="Also score the ensemble with these BM25/vector weights")
+    parser.add_argument("--offline", action="store_true", help="Use the benchmark's fake models and in-memory vector store")
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    args = parser.parse_args()
+
+    # Evals run behind live traffic in the shared OpenAI rate limiter
+    set_default_priority("eval")
+
+    if args.offline:
+        install_fakes(llm_latency=0.0, embedding_latency=0.0)
+
+    register_variants(args.chunk_size, args.weights)
+    names = args.retriever + [f"bm25@{size}" for size in args.chunk_size]
+    if args.weights:
+        names.append(f"ensemble@{args.weights[0]}/{args.weights[1]}")
+
+    dataset = load_synthetic_data(args.dataset)
+    if NORMALIZE_OCR:
+        dataset = normalize_references(dataset)
+    results = []
+    for name in names:
+        print(f"Scoring {name}...")
+        results.append(evaluate_retriever(name, dataset, sorted(args.k), args.threshold, args.scorer))
+
+    results_df = pd.DataFrame(results)
+    print(results_df.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    filename = save_results(results_df)
+    print(f"Results saved to: {filename}")
+
+
+if __name__ == "__main__":
+    main()
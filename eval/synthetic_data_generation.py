@@ -1,53 +1,152 @@
+import argparse
 import os
 import sys
 from dotenv import load_dotenv
+from ragas import RunConfig
 from ragas.testset import TestsetGenerator
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.document_loaders import DirectoryLoader, JSONLoader
+from ragas.testset.graph import KnowledgeGraph, Node, NodeType
+from ragas.testset.transforms import Parallel, RelationshipBuilder, apply_transforms, default_transforms
 from ragas.llms import LangchainLLMWrapper
 from ragas.embeddings import LangchainEmbeddingsWrapper
 
 # Add the parent directory to the path so we can import from src
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.corpus import iter_articles, stratified_sample
+from src.models import chat_model, embedding_model
+from src.rate_limit import set_default_priority
 
 # Load environment variables
 load_dotenv()
 
 # Load the articles from the directory using the same approach as embed_articles.py
 PATH = "../data/articles_1861_sample"
+KNOWLEDGE_GRAPH_PATH = "../data/knowledge_graph.json"
 
-def metadata_func(record, metadata):
-    metadata["newspaper_name"] = record.get("newspaper_name")
-    metadata["date"] = record.get("date")
-    
-    return metadata
-
-directory_loader = DirectoryLoader(
-    PATH,
-    glob="*.json",
-    loader_cls=JSONLoader,
-    loader_kwargs={
-        "jq_schema": '.',
-        "content_key": "article",
-        "metadata_func": metadata_func,
-    }
-)
-
-article_resources = directory_loader.load()
-
-# Set up LLM and embedding models
-generator_llm = LangchainLLMWrapper(ChatOpenAI(model="gpt-4o-mini", temperature=0.1))
-generator_embeddings = LangchainEmbeddingsWrapper(OpenAIEmbeddings(model="text-embedding-3-small"))
-
-# Create testset generator
-generator = TestsetGenerator(llm=generator_llm, embedding_model=generator_embeddings)
-
-# Generate synthetic dataset
-print("Generating synthetic dataset...")
-dataset = generator.generate_with_langchain_docs(article_resources, testset_size=50)
-
-# Save the dataset as JSON
-import pandas as pd
-df = dataset.to_pandas()
-df.to_json("../data/synthetic_dataset.json", orient="records", indent=2)
-print(f"Dataset saved with {len(dataset)} examples to data/synthetic_dataset.json")
\ No newline at end of file
+# Relationships created by the splitters; every other relationship comes from
+# a RelationshipBuilder and is recomputed over the merged graph
+STRUCTURAL_RELATIONSHIPS = {"child", "next"}
+
+
+def split_transforms(transforms):
+    """Split the default transforms into per-node steps and graph-wide relationship builders."""
+    node_steps, relationship_builders = [], []
+    for step in transforms:
+        parts = step.transformations if isinstance(step, Parallel) else [step]
+        builders = [part for part in parts if isinstance(part, RelationshipBuilder)]
+        others = [part for part in parts if not isinstance(part, RelationshipBuilder)]
+        relationship_builders.extend(builders)
+        if others:
+            node_steps.append(Parallel(*others) if len(others) > 1 else others[0])
+    return node_steps, relationship_builders
+
+
+def article_id(node):
+    return node.properties.get("document_metadata", {}).get("article_id")
+
+
+def load_knowledge_graph(path: str) -> KnowledgeGraph:
+    if os.path.exists(path):
+        kg = KnowledgeGraph.load(path)
+        print(f"Loaded knowledge graph with {len(kg.nodes)} nodes from {path}")
+        return kg
+    return KnowledgeGraph()
+
+
+def drop_documents(kg: KnowledgeGraph, article_ids: set):
+    """Remove document nodes for article_ids along with the chunks split from them."""
+    removed = {node.id for node in kg.nodes if node.type == NodeType.DOCUMENT and article_id(node) in article_ids}
+    frontier = set(removed)
+    while frontier:
+        children = {
+            rel.target.id for rel in kg.relationships
+            if rel.type == "child" and rel.source.id in frontier and rel.target.id not in removed
+        }
+        removed |= children
+        frontier = children
+    kg.nodes = [node for node in kg.nodes if node.id not in removed]
+    kg.relationships = [
+        rel for rel in kg.relationships if rel.source.id not in removed and rel.target.id not in removed
+    ]
+
+
+def update_knowledge_graph(kg: KnowledgeGraph, documents: list, llm, embeddings, run_config: RunConfig) -> KnowledgeGraph:
+    """
+    Bring a persisted knowledge graph in line with documents, paying only for what changed.
+
+    Documents already in the graph keep their extracted summaries, themes,
+    entities and embeddings. Documents no longer sampled are dropped. Only new
+    documents go through the LLM and embedding transforms; the cheap
+    relationship builders then rerun over the merged graph.
+    """
+    wanted = {document.metadata["article_id"] for document in documents}
+    existing = {article_id(node) for node in kg.nodes if node.type == NodeType.DOCUMENT}
+
+    drop_documents(kg, existing - wanted)
+    new_documents = [document for document in documents if document.metadata["article_id"] not in existing]
+    print(f"Knowledge graph: {len(existing & wanted)} documents reused, {len(existing - wanted)} dropped, {len(new_documents)} new")
+
+    # default_transforms only looks at document lengths to pick its pipeline, so
+    # pass the whole sample to get the same pipeline for every increment
+    node_steps, relationship_builders = split_transforms(default_transforms(documents, llm, embeddings))
+
+    if new_documents:
+        increment = KnowledgeGraph(nodes=[
+            Node(
+                type=NodeType.DOCUMENT,
+                properties={"page_content": document.page_content, "document_metadata": document.metadata},
+            )
+            for document in new_documents
+        ])
+        apply_transforms(increment, node_steps, run_config)
+        kg.nodes.extend(increment.nodes)
+        kg.relationships.extend(increment.relationships)
+
+    kg.relationships = [rel for rel in kg.relationships if rel.type in STRUCTURAL_RELATIONSHIPS]
+    apply_transforms(kg, relationship_builders, run_config)
+    return kg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic test set from a stratified sample of the corpus")
+    parser.add_argument("--path", default=PATH, help="Directory of article JSON files")
+    parser.add_argument("--sample-size", type=int, default=50, help="Articles to sample across months and newspapers")
+    parser.add_argument("--testset-size", type=int, default=50)
+    parser.add_argument("--knowledge-graph", default=KNOWLEDGE_GRAPH_PATH, help="Where the knowledge graph is loaded from and saved to")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum concurrent LLM/embedding calls")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="../data/synthetic_dataset.json")
+    args = parser.parse_args()
+
+    # Evals run behind live traffic in the shared OpenAI rate limiter
+    set_default_priority("eval")
+
+    # Set up LLM and embedding models
+    generator_llm = LangchainLLMWrapper(chat_model("gpt-4o-mini", temperature=0.1))
+    generator_embeddings = LangchainEmbeddingsWrapper(embedding_model("text-embedding-3-small"))
+    run_config = RunConfig(max_workers=args.concurrency, seed=args.seed)
+
+    # Stream the corpus once to pick the sample, then read only the sampled files
+    filepaths = stratified_sample(args.path, args.sample_size, args.seed)
+    documents = list(iter_articles(filepaths=filepaths))
+    print(f"Sampled {len(documents)} articles from {args.path}")
+
+    kg = load_knowledge_graph(args.knowledge_graph)
+    kg = update_knowledge_graph(kg, documents, generator_llm, generator_embeddings, run_config)
+    kg.save(args.knowledge_graph)
+    print(f"Saved knowledge graph with {len(kg.nodes)} nodes to {args.knowledge_graph}")
+
+    # Create testset generator
+    generator = TestsetGenerator(llm=generator_llm, embedding_model=generator_embeddings, knowledge_graph=kg)
+
+    # Generate synthetic dataset
+    print("Generating synthetic dataset...")
+    dataset = generator.generate(testset_size=args.testset_size, run_config=run_config)
+
+    # Save the dataset as JSON
+    df = dataset.to_pandas()
+    df.to_json(args.output, orient="records", indent=2)
+    print(f"Dataset saved with {len(dataset)} examples to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+from langchain_community.retrievers import BM25Retriever
+
+# Handle import for both direct execution and module import
+try:
+    from .corpus import load_and_chunk_documents
+    from .ocr_normalize import tokenize
+except ImportError:
+    from corpus import load_and_chunk_documents
+    from ocr_normalize import tokenize
+
+# Create BM25Retriever with the same chunks as embed_articles.py
+document_chunks = load_and_chunk_documents()
+# Case-folded, OCR-repaired tokens for both chunks and queries
+bm25_retriever = BM25Retriever.from_documents(document_chunks, preprocess_func=tokenize)
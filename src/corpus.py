@@ -0,0 +1,137 @@
+import json
+import math
+import os
+import random
+import tiktoken
+from collections import defaultdict
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import DirectoryLoader, JSONLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# Handle import for both direct execution and module import
+try:
+    from .ocr_normalize import NORMALIZE_OCR, normalize_documents
+except ImportError:
+    from ocr_normalize import NORMALIZE_OCR, normalize_documents
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "articles_1861_sample")
+
+
+def metadata_func(record, metadata):
+    metadata["newspaper_name"] = record.get("newspaper_name")
+    metadata["date"] = record.get("date")
+
+    return metadata
+
+
+def tiktoken_len(text):
+    tokens = tiktoken.encoding_for_model("gpt-4o").encode(text)
+    return len(tokens)
+
+
+def load_articles(path=DEFAULT_PATH):
+    """Load every article JSON file in a directory as a Document"""
+    directory_loader = DirectoryLoader(
+        path,
+        glob="*.json",
+        loader_cls=JSONLoader,
+        loader_kwargs={
+            "jq_schema": '.',
+            "content_key": "article",
+            "metadata_func": metadata_func,
+        }
+    )
+
+    return directory_loader.load()
+
+
+def chunk_documents(documents, chunk_size=750, chunk_overlap=0):
+    """Split documents into token-sized chunks, as stored in the vector store"""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=tiktoken_len,
+    )
+
+    return text_splitter.split_documents(documents)
+
+
+def load_and_chunk_documents(path=DEFAULT_PATH, normalize=NORMALIZE_OCR):
+    """Load articles, clean their OCR noise and create the same chunks used by embedding and BM25"""
+    documents = load_articles(path)
+    if normalize:
+        documents = normalize_documents(documents)
+    return chunk_documents(documents)
+
+
+def iter_article_files(path=DEFAULT_PATH):
+    """Yield article JSON file paths in a stable order without listing them all up front"""
+    with os.scandir(path) as entries:
+        names = sorted(entry.name for entry in entries if entry.name.endswith(".json"))
+    for name in names:
+        yield os.path.join(path, name)
+
+
+def read_article(filepath):
+    """Read one article file as a Document with the same metadata as load_articles"""
+    with open(filepath, "r", encoding="utf-8") as f:
+        record = json.load(f)
+    metadata = metadata_func(record, {"source": filepath, "seq_num": 1})
+    metadata["article_id"] = record.get("article_id") or os.path.basename(filepath)
+
+    return Document(page_content=record.get("article", ""), metadata=metadata)
+
+
+def iter_articles(path=DEFAULT_PATH, filepaths=None):
+    """Stream articles one at a time, so only the current file is held in memory"""
+    for filepath in filepaths if filepaths is not None else iter_article_files(path):
+        yield read_article(filepath)
+
+
+def stratum_key(document):
+    """Stratum used for sampling: month of publication and newspaper title"""
+    return ((document.metadata.get("date") or "")[:7], document.metadata.get("newspaper_name") or "")
+
+
+def stratified_sample(path=DEFAULT_PATH, sample_size=50, seed=42):
+    """
+    Pick sample_size article files spread proportionally across strata
+    (publication month x newspaper) in a single streaming pass.
+
+    Each stratum keeps a reservoir of at most sample_size file paths, so memory
+    stays bounded by the number of strata rather than the size of the corpus.
+
+    Returns:
+        Sorted list of the selected file paths
+    """
+    rng = random.Random(seed)
+    reservoirs = defaultdict(list)
+    counts = defaultdict(int)
+
+    for filepath in iter_article_files(path):
+        key = stratum_key(read_article(filepath))
+        counts[key] += 1
+        reservoir = reservoirs[key]
+        if len(reservoir) < sample_size:
+            reservoir.append(filepath)
+        else:
+            slot = rng.randrange(counts[key])
+            if slot < sample_size:
+                reservoir[slot] = filepath
+
+    total = sum(counts.values())
+    if total <= sample_size:
+        return sorted(filepath for reservoir in reservoirs.values() for filepath in reservoir)
+
+    # Proportional allocation, handing leftover slots to the largest remainders
+    shares = {key: sample_size * count / total for key, count in counts.items()}
+    quotas = {key: math.floor(share) for key, share in shares.items()}
+    leftover = sample_size - sum(quotas.values())
+    for key in sorted(shares, key=lambda key: (quotas[key] - shares[key], key))[:leftover]:
+        quotas[key] += 1
+
+    selected = []
+    for key, reservoir in reservoirs.items():
+        selected.extend(rng.sample(reservoir, min(quotas[key], len(reservoir))))
+    return sorted(selected)
@@ -0,0 +1,142 @@
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Reprinted wire stories differ by OCR noise, headings and line breaks, so
+# compare overlapping character 5-grams of normalized text rather than words
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+# 32 bands of 4 rows: pairs with Jaccard similarity around 0.42 and above
+# become LSH candidates, and candidates are then checked against THRESHOLD
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.5
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1861)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of a text's character shingles"""
+    text = normalize_text(text)
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    hashes = np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in shingles], dtype=np.uint64)
+    # Universal hashing (a*x + b mod p) gives NUM_PERM independent permutations at once
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(a == b))
+
+
+def ocr_quality(text: str) -> float:
+    """Share of letters and spaces; the cleanest OCR copy of a cluster is kept"""
+    return sum(char.isalpha() or char.isspace() for char in text) / len(text) if text else 0.0
+
+
+def find_clusters(documents: List[Document], threshold: float = THRESHOLD) -> List[List[int]]:
+    """
+    Group near-duplicate documents with MinHash LSH.
+
+    Returns clusters as lists of document indexes, one per group of reprints,
+    including singletons, in order of first appearance.
+    """
+    signatures = [minhash(document.page_content) for document in documents]
+
+    parent = list(range(len(documents)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(BANDS):
+        buckets = defaultdict(list)
+        for i, signature in enumerate(signatures):
+            buckets[signature[band * ROWS:(band + 1) * ROWS].tobytes()].append(i)
+        for members in buckets.values():
+            for other in members[1:]:
+                root, other_root = find(members[0]), find(other)
+                if root != other_root and similarity(signatures[members[0]], signatures[other]) >= threshold:
+                    parent[other_root] = root
+
+    clusters = defaultdict(list)
+    for i in range(len(documents)):
+        clusters[find(i)].append(i)
+    return sorted(clusters.values(), key=lambda members: members[0])
+
+
+def deduplicate(documents: List[Document], threshold: float = THRESHOLD, keep_duplicates: bool = False) -> List[Document]:
+    """
+    Cluster reprinted chunks and mark one canonical chunk per cluster.
+
+    Every chunk gets a cluster_id. The canonical chunk (the cleanest OCR copy)
+    also lists every member's source and newspaper, so the stored copy links
+    back to all the papers that printed it. Unless keep_duplicates is set,
+    only canonical chunks are returned, which is what gets embedded.
+    """
+    kept = []
+    for members in find_clusters(documents, threshold):
+        canonical = max(members, key=lambda i: (ocr_quality(documents[i].page_content), len(documents[i].page_content)))
+        cluster_id = f"{documents[canonical].metadata.get('source', '')}#{zlib.crc32(documents[canonical].page_content.encode('utf-8')):08x}"
+        for i in members:
+            documents[i].metadata["cluster_id"] = cluster_id
+            documents[i].metadata["canonical"] = i == canonical
+        if len(members) > 1:
+            documents[canonical].metadata["duplicate_sources"] = [documents[i].metadata.get("source") for i in members]
+            documents[canonical].metadata["duplicate_newspapers"] = sorted(
+                {documents[i].metadata.get("newspaper_name") for i in members if documents[i].metadata.get("newspaper_name")}
+            )
+        kept.extend(documents[i] for i in members if keep_duplicates or i == canonical)
+    return kept
+
+
+def collapse_duplicates(documents: List[Document], threshold: float = THRESHOLD, k: Optional[int] = None) -> List[Document]:
+    """
+    Keep only the best-ranked document of each cluster in a ranked result list.
+
+    Documents are grouped by the cluster_id stored at ingestion. Only documents
+    without one (e.g. from the in-process BM25 index) are compared by MinHash,
+    against the documents kept so far; those signatures are computed lazily,
+    so results that all carry a cluster_id are never hashed.
+    """
+    kept: List[Document] = []
+    seen_clusters = set()
+    signatures: Dict[int, np.ndarray] = {}
+
+    def signature(i: int) -> np.ndarray:
+        if i not in signatures:
+            signatures[i] = minhash(kept[i].page_content)
+        return signatures[i]
+
+    for document in documents:
+        cluster_id = document.metadata.get("cluster_id")
+        if cluster_id is not None:
+            if cluster_id in seen_clusters:
+                continue
+            seen_clusters.add(cluster_id)
+        else:
+            candidate = minhash(document.page_content)
+            if any(similarity(candidate, signature(i)) >= threshold for i in range(len(kept))):
+                continue
+            signatures[len(kept)] = candidate
+        kept.append(document)
+        if k is not None and len(kept) >= k:
+            break
+    return kept
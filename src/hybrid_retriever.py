@@ -0,0 +1,295 @@
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
+
+# Handle import for both direct execution and module import
+try:
+    from .metrics import observe_step
+    from .models import COLLECTION_NAME, chat_model, vector_store
+except ImportError:
+    from metrics import observe_step
+    from models import COLLECTION_NAME, chat_model, vector_store
+
+# Postgres text search configuration used for the lexical index
+TEXT_SEARCH_CONFIG = "english"
+
+# A generated column keeps the tsvector in step with every row PGVector writes,
+# so lexical and vector search always see the same chunks
+LEXICAL_INDEX_DDL = [
+    f"""
+    ALTER TABLE langchain_pg_embedding
+    ADD COLUMN IF NOT EXISTS document_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(document, ''))) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_document_tsv
+    ON langchain_pg_embedding USING gin (document_tsv)
+    """,
+]
+
+# Every phrasing of the question is searched in one statement: the variants
+# and their embeddings are unnested side by side, and LATERAL subqueries take
+# the top candidates from each signal per variant. Within a variant the two
+# signals are fused with weighted reciprocal rank fusion, the same score
+# EnsembleRetriever computes: weight / (c + rank). Each variant's top k are
+# then fused across variants with plain RRF, as reciprocal_rank_fusion does;
+# a single variant keeps its own order.
+# plainto_tsquery ANDs every term; OR-ing them instead matches how BM25
+# scores any overlap, and ts_rank_cd ranks chunks that match more terms higher.
+HYBRID_QUERY = f"""
+WITH collection AS (
+    SELECT uuid FROM langchain_pg_collection WHERE name = :collection
+),
+variants AS (
+    SELECT v.variant,
+           CAST(v.embedding AS vector) AS embedding,
+           replace(plainto_tsquery('{TEXT_SEARCH_CONFIG}', v.query)::text, '&', '|')::tsquery AS q
+    FROM unnest(CAST(:queries AS text[]), CAST(:embeddings AS text[])) WITH ORDINALITY AS v(query, embedding, variant)
+),
+vector AS (
+    SELECT q.variant, s.id, row_number() OVER (PARTITION BY q.variant ORDER BY s.distance) AS rank
+    FROM variants q CROSS JOIN LATERAL (
+        SELECT e.id, e.embedding <=> q.embedding AS distance
+        FROM langchain_pg_embedding e JOIN collection c ON e.collection_id = c.uuid
+        ORDER BY distance
+        LIMIT :candidates
+    ) s
+),
+lexical AS (
+    SELECT q.variant, s.id, row_number() OVER (PARTITION BY q.variant ORDER BY s.score DESC) AS rank
+    FROM variants q CROSS JOIN LATERAL (
+        SELECT e.id, ts_rank_cd(e.document_tsv, q.q) AS score
+        FROM langchain_pg_embedding e JOIN collection c ON e.collection_id = c.uuid
+        WHERE e.document_tsv @@ q.q
+        ORDER BY score DESC
+        LIMIT :candidates
+    ) s
+),
+hybrid AS (
+    SELECT coalesce(v.variant, l.variant) AS variant,
+           coalesce(v.id, l.id) AS id,
+           coalesce(CAST(:vector_weight AS float) / (:c + v.rank), 0)
+         + coalesce(CAST(:lexical_weight AS float) / (:c + l.rank), 0) AS score
+    FROM vector v FULL OUTER JOIN lexical l ON v.variant = l.variant AND v.id = l.id
+),
+ranked AS (
+    SELECT variant, id, row_number() OVER (PARTITION BY variant ORDER BY score DESC) AS rank
+    FROM hybrid
+),
+fused AS (
+    SELECT id, sum(1.0 / (:c + rank)) AS score
+    FROM ranked
+    WHERE rank <= :k
+    GROUP BY id
+)
+SELECT e.id, e.document, e.cmetadata, f.score
+FROM fused f JOIN langchain_pg_embedding e ON e.id = f.id
+ORDER BY f.score DESC
+LIMIT :k
+"""
+
+_indexed_engines = set()
+_index_lock = Lock()
+
+
+def ensure_lexical_index(engine: Any):
+    """
+    Add the tsvector column and its GIN index to the embedding table, once per
+    engine. This is a migration: on an existing table it rewrites every row
+    under an exclusive lock, so only ingestion (or `python hybrid_retriever.py`)
+    runs it, never the query path.
+    """
+    import sqlalchemy
+
+    with _index_lock:
+        if engine.url in _indexed_engines:
+            return
+        with engine.begin() as conn:
+            for statement in LEXICAL_INDEX_DDL:
+                conn.execute(sqlalchemy.text(statement))
+        _indexed_engines.add(engine.url)
+
+
+def check_lexical_index(engine: Any):
+    """Raise if the embedding table has no document_tsv column yet; read-only, checked once per engine."""
+    import sqlalchemy
+
+    with _index_lock:
+        if engine.url in _indexed_engines:
+            return
+        with engine.connect() as conn:
+            exists = conn.execute(sqlalchemy.text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'langchain_pg_embedding' AND column_name = 'document_tsv'"
+            )).first()
+        if not exists:
+            raise RuntimeError(
+                "langchain_pg_embedding has no document_tsv column for the hybrid retriever; "
+                "run embed_articles.py or `python hybrid_retriever.py` from src to add it"
+            )
+        _indexed_engines.add(engine.url)
+
+
+def is_postgres(store: Any) -> bool:
+    return type(store).__module__.startswith("langchain_postgres")
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Document]], k: int, c: int = 60) -> List[Document]:
+    """Fuse ranked lists (one per query variant or shard) by summing 1 / (c + rank) per chunk"""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranked in ranked_lists:
+        for rank, document in enumerate(ranked, start=1):
+            key = document.page_content
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (c + rank)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ordered[:k]]
+
+
+def query_generator() -> Runnable:
+    """The MultiQueryRetriever prompt and parser as a runnable: question -> alternative phrasings"""
+    from langchain.retrievers.multi_query import DEFAULT_QUERY_PROMPT, LineListOutputParser
+
+    return DEFAULT_QUERY_PROMPT | chat_model("gpt-4o-mini", temperature=0) | LineListOutputParser()
+
+
+def query_variants(query: str, generator: Optional[Runnable], run_manager: CallbackManagerForRetrieverRun) -> List[str]:
+    """The question followed by its distinct alternative phrasings, if a generator is given"""
+    queries = [query]
+    if generator is not None:
+        variants = generator.invoke({"question": query}, config={"callbacks": run_manager.get_child()})
+        queries.extend(variant for variant in variants if variant.strip() and variant not in queries)
+    return queries
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Lexical (Postgres full-text) and vector search over one PGVector collection,
+    fused with reciprocal rank fusion in a single SQL round trip.
+
+    Replaces the in-process BM25 + vector ensemble: no per-worker BM25 index
+    to build or hold in memory, and no second retrieval hop. With a
+    query_generator, every phrasing of the question is searched (as the
+    ensemble's multi-query side did) and fused across phrasings in the same
+    statement; only generating the phrasings and embedding them (in one
+    request) happen before it.
+
+    Callers that already embedded the query (e.g. ShardedRetriever, which
+    searches one query in several collections) pass it with
+    retriever.invoke(query, embedding=vector).
+    """
+
+    engine: Any
+    embeddings: Embeddings
+    collection_name: str = COLLECTION_NAME
+    k: int = 5
+    candidates: int = 20
+    """How many top chunks each signal contributes before fusion."""
+    weights: Tuple[float, float] = (0.5, 0.5)
+    """Lexical and vector weights, in the same order as the ensemble's [bm25, vector]."""
+    c: int = 60
+    query_generator: Optional[Runnable] = None
+    """Optional runnable turning a question into alternative phrasings."""
+
+    def _search(self, queries: List[str], embeddings: List[List[float]]) -> List[Document]:
+        import sqlalchemy
+
+        lexical_weight, vector_weight = self.weights
+        with self.engine.connect() as conn:
+            rows = conn.execute(sqlalchemy.text(HYBRID_QUERY), {
+                "collection": self.collection_name,
+                "queries": list(queries),
+                "embeddings": [str(list(embedding)) for embedding in embeddings],
+                "candidates": self.candidates,
+                "vector_weight": vector_weight,
+                "lexical_weight": lexical_weight,
+                "c": self.c,
+                "k": self.k,
+            }).fetchall()
+        return [
+            Document(id=str(row.id), page_content=row.document, metadata=row.cmetadata or {})
+            for row in rows
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, embedding: Optional[List[float]] = None
+    ) -> List[Document]:
+        check_lexical_index(self.engine)
+        if embedding is not None:
+            queries, embeddings = [query], [embedding]
+        else:
+            queries = query_variants(query, self.query_generator, run_manager)
+            # One embedding request for every phrasing
+            embeddings = [self.embeddings.embed_query(query)] if len(queries) == 1 else self.embeddings.embed_documents(queries)
+
+        with observe_step("hybrid_sql"):
+            return self._search(queries, embeddings)
+
+
+def hybrid_retriever(
+    collection_name: str = COLLECTION_NAME,
+    load_documents: Optional[Callable[[], List[Document]]] = None,
+    k: int = 5,
+    multi_query: bool = False,
+) -> BaseRetriever:
+    """
+    Hybrid retriever for a collection.
+
+    Postgres-backed collections get the single-query HybridRetriever. Any other
+    vector store (e.g. the benchmark's in-memory one) falls back to the
+    equivalent in-process fusion of BM25 and vector search; only then are the
+    collection's chunks loaded, with load_documents (default: the local corpus).
+
+    Args:
+        collection_name: PGVector collection to search
+        load_documents: Chunks for the in-process BM25 fallback
+        k: Chunks returned per query
+        multi_query: Also search LLM-generated rephrasings of the question,
+            like the multi_query side of the ensemble retriever
+    """
+    store = vector_store(collection_name)
+    generator = query_generator() if multi_query else None
+    if is_postgres(store):
+        return HybridRetriever(
+            engine=store._engine, embeddings=store.embeddings, collection_name=collection_name, k=k, query_generator=generator
+        )
+
+    from langchain.retrievers import EnsembleRetriever
+    from langchain.retrievers.multi_query import MultiQueryRetriever
+    from langchain_community.retrievers import BM25Retriever
+
+    try:
+        from .ocr_normalize import tokenize
+    except ImportError:
+        from ocr_normalize import tokenize
+    if load_documents is None:
+        try:
+            from .corpus import load_and_chunk_documents as load_documents
+        except ImportError:
+            from corpus import load_and_chunk_documents as load_documents
+    vector_retriever = store.as_retriever(search_type="similarity", search_kwargs={"k": k})
+    if generator is not None:
+        vector_retriever = MultiQueryRetriever(retriever=vector_retriever, llm_chain=generator)
+    return EnsembleRetriever(
+        retrievers=[
+            BM25Retriever.from_documents(load_documents(), k=k, preprocess_func=tokenize),
+            vector_retriever,
+        ],
+        weights=[0.5, 0.5],
+    )
+
+
+if __name__ == "__main__":
+    # Migration for databases ingested before the hybrid retriever existed:
+    # adds the generated tsvector column and its GIN index (rewrites the table)
+    store = vector_store()
+    if not is_postgres(store):
+        raise SystemExit("The lexical index is only needed for PGVector stores")
+    ensure_lexical_index(store._engine)
+    print("Added document_tsv and its GIN index to langchain_pg_embedding")
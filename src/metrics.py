@@ -0,0 +1,302 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+# Prometheus text exposition format served by app.py at /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+
+# Friendlier step names for the retrievers used in the graph
+RETRIEVER_STEPS = {
+    "BM25Retriever": "bm25",
+    "VectorStoreRetriever": "vector_search",
+    "MultiQueryRetriever": "multi_query",
+    "EnsembleRetriever": "ensemble",
+    "HybridRetriever": "hybrid",
+    "ShardedRetriever": "sharded",
+}
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonically increasing value per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Cumulative bucketed observations per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, list] = {}
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """Also pass every raw observation to listener(value, labels), e.g. to compute exact percentiles"""
+        self._listeners.append(listener)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        for listener in self._listeners:
+            listener(value, labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def collect(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, counts[-1]
+
+
+class Registry:
+    """Holds every metric and renders them in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.collect():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+NODE_LATENCY = REGISTRY.histogram(
+    "travellm_node_latency_seconds", "Wall time spent in each graph node", ["node"]
+)
+STEP_LATENCY = REGISTRY.histogram(
+    "travellm_step_latency_seconds", "Wall time of sub-steps (retrievers, LLM calls, LOC HTTP)", ["node", "step"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "travellm_llm_tokens_total", "Tokens reported by the model provider", ["node", "model", "type"]
+)
+LLM_COST = REGISTRY.counter(
+    "travellm_llm_cost_usd_total", "Estimated LLM spend in USD", ["model"]
+)
+CACHE_HITS = REGISTRY.counter(
+    "travellm_cache_hits_total", "Requests served without doing the work again", ["cache"]
+)
+ERRORS = REGISTRY.counter(
+    "travellm_errors_total", "Exceptions raised by nodes and sub-steps", ["node", "step"]
+)
+RATE_LIMIT_WAIT = REGISTRY.histogram(
+    "travellm_openai_rate_limit_wait_seconds",
+    "Time OpenAI calls spent queued in the client-side rate limiter",
+    ["priority"],
+    buckets=(0.001, 0.005) + DEFAULT_BUCKETS,
+)
+
+# Name of the graph node currently executing, used to label sub-steps
+_current_node: ContextVar[str] = ContextVar("travellm_current_node", default="")
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+def instrument_node(func):
+    """Decorator recording latency and errors for a graph node"""
+
+    @functools.wraps(func)
+    def wrapper(state, *args, **kwargs):
+        node = func.__name__
+        token = _current_node.set(node)
+        start = time.perf_counter()
+        try:
+            return func(state, *args, **kwargs)
+        except Exception:
+            ERRORS.inc(node=node, step="node")
+            raise
+        finally:
+            NODE_LATENCY.observe(time.perf_counter() - start, node=node)
+            _current_node.reset(token)
+
+    return wrapper
+
+
+@contextmanager
+def observe_step(step: str):
+    """Time a sub-step of the current node, counting it as an error if it raises"""
+    node = _current_node.get()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(node=node, step=step)
+        raise
+    finally:
+        STEP_LATENCY.observe(time.perf_counter() - start, node=node, step=step)
+
+
+def _model_price(model: str) -> Optional[tuple]:
+    # Longest prefix wins so dated snapshots ("gpt-4o-mini-2024-07-18") resolve
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_PRICES[name]
+    return None
+
+
+def record_llm_usage(node: str, model: str, usage: Dict[str, Any]):
+    """Record token counts and cost from LangChain usage metadata"""
+    input_tokens = usage.get("input_tokens", 0) or 0
+    output_tokens = usage.get("output_tokens", 0) or 0
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+    LLM_TOKENS.inc(input_tokens - cached_tokens, node=node, model=model, type="input")
+    LLM_TOKENS.inc(cached_tokens, node=node, model=model, type="cached_input")
+    LLM_TOKENS.inc(output_tokens, node=node, model=model, type="output")
+
+    price = _model_price(model)
+    if price:
+        input_price, cached_price, output_price = price
+        cost = (
+            (input_tokens - cached_tokens) * input_price
+            + cached_tokens * cached_price
+            + output_tokens * output_price
+        ) / 1_000_000
+        LLM_COST.inc(cost, model=model)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times LLM and retriever runs and records token usage for every LangChain call"""
+
+    def __init__(self):
+        self._runs: Dict[UUID, tuple] = {}
+
+    def _start(self, run_id: UUID, step: str, metadata: Optional[dict], model: str = ""):
+        node = _current_node.get() or (metadata or {}).get("langgraph_node", "")
+        self._runs[run_id] = (node, step, model, time.perf_counter())
+
+    def _end(self, run_id: UUID, error: bool = False):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        node, step, model, start = run
+        STEP_LATENCY.observe(time.perf_counter() - start, node=node, step=step)
+        if error:
+            ERRORS.inc(node=node, step=step)
+        return node, model
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        self._start(run_id, "llm", metadata, params.get("model_name") or params.get("model", ""))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        self._start(run_id, "llm", metadata, params.get("model_name") or params.get("model", ""))
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        run = self._end(run_id)
+        if run is None:
+            return
+        node, model = run
+        model = (response.llm_output or {}).get("model_name") or model
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    model = message.response_metadata.get("model_name") or model
+                    record_llm_usage(node, model, usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+    def on_retriever_start(self, serialized, query, *, run_id, metadata=None, **kwargs):
+        name = kwargs.get("name") or ""
+        self._start(run_id, RETRIEVER_STEPS.get(name, name.lower() or "retriever"), metadata)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+
+metrics_handler = MetricsCallbackHandler()
+
+# Attach the handler to every LangChain run in the process, in every thread,
+# without having to thread callbacks through each invoke call
+_metrics_callback_var: ContextVar[Optional[BaseCallbackHandler]] = ContextVar(
+    "travellm_metrics_callback", default=metrics_handler
+)
+register_configure_hook(_metrics_callback_var, inheritable=True)
@@ -0,0 +1,241 @@
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
+
+# Set OCR_NORMALIZE=0 to ingest and index the raw OCR text
+NORMALIZE_OCR = os.getenv("OCR_NORMALIZE", "1") != "0"
+
+# Word-splitting hyphens at line ends ("de-\nclaring")
+HYPHEN_BREAK = re.compile(r"(?<=[A-Za-z])-[ \t]*\n[ \t]*(?=[a-z])")
+WORD = re.compile(r"[A-Za-z0-9]+")
+ORDINAL = re.compile(r"^\d+(st|nd|rd|th|d)$", re.IGNORECASE)
+
+# Digits OCR reads in place of letters, only repaired where they sit between
+# letters ("G0vernment"), so numbers, dates, ordinals and identifiers such as
+# "A1" or "I0" are left alone
+DIGIT_LETTERS = str.maketrans({"0": "o", "1": "l", "5": "s", "6": "b"})
+INNER_DIGITS = re.compile(r"(?<=[a-z])[0-9]+(?=[a-z])")
+
+# Misreadings of very common words that are frequent enough to be trusted by
+# the corpus dictionary, so they would never be corrected from it
+OCR_FIXES = {"tho": "the", "tbe": "the", "thc": "the", "ihe": "the", "aud": "and", "anu": "and"}
+
+# Dictionary correction: a word seen fewer than MIN_COUNT times is replaced by a
+# word seen at least RATIO times as often within one edit (two for long words)
+MIN_COUNT = 3
+RATIO = 5
+MIN_CORRECTABLE_LENGTH = 5
+TWO_EDIT_LENGTH = 9
+
+# Rare tokens compared against the trusted vocabulary per cdist call, bounding
+# the distance matrix to CORRECTION_BLOCK x vocabulary
+CORRECTION_BLOCK = 256
+
+# Corpora smaller than this are normalized in-process
+PARALLEL_THRESHOLD = 200
+
+
+def repair_token(token: str) -> str:
+    """Case-fold a token and fix digit/letter confusions and common misreadings"""
+    token = token.lower()
+    if token.isalpha() or token.isdigit() or ORDINAL.match(token):
+        # Words, numbers and ordinals ("1st", "2d") are left as they are
+        return OCR_FIXES.get(token, token)
+    if token[0] == "1" and len(token) <= 3 and token[1:].isalpha():
+        # "1t", "1n", "1s": a capital I read as a one
+        return "i" + token[1:]
+    token = INNER_DIGITS.sub(lambda match: match.group().translate(DIGIT_LETTERS), token)
+    return OCR_FIXES.get(token, token)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lexical tokens for BM25: case-folded words with OCR repairs. Used as the
+    BM25 preprocess_func for both documents and queries.
+    """
+    return [repair_token(token) for token in WORD.findall(HYPHEN_BREAK.sub("", text))]
+
+
+def _count_tokens(texts: List[str]) -> Counter:
+    counts = Counter()
+    for text in texts:
+        counts.update(tokenize(text))
+    return counts
+
+
+def build_corrections(counts: Counter) -> Dict[str, str]:
+    """
+    Map rare tokens to a much more frequent token within one or two edits.
+
+    rapidfuzz computes the distances from each block of rare tokens to every
+    trusted token in parallel C++ (cdist), and numpy picks the best candidate
+    per row, so there is no Python loop over token pairs.
+    """
+    trusted = [token for token, count in counts.most_common() if count >= MIN_COUNT and token.isalpha()]
+    rare = [
+        token for token, count in counts.items()
+        if count < MIN_COUNT and len(token) >= MIN_CORRECTABLE_LENGTH and token.isalpha()
+    ]
+    if not trusted or not rare:
+        return {}
+
+    trusted_counts = np.array([counts[token] for token in trusted])
+    corrections = {}
+    for start in range(0, len(rare), CORRECTION_BLOCK):
+        block = rare[start:start + CORRECTION_BLOCK]
+        distances = process.cdist(block, trusted, scorer=Levenshtein.distance, score_cutoff=2, dtype=np.int32, workers=-1)
+        max_edits = np.array([2 if len(token) >= TWO_EDIT_LENGTH else 1 for token in block])
+        rare_counts = np.array([counts[token] for token in block])
+        allowed = (distances <= max_edits[:, None]) & (trusted_counts[None, :] >= RATIO * rare_counts[:, None])
+        # Trusted tokens are in frequency order, so argmin breaks ties towards the commoner word
+        best = np.where(allowed, distances, np.iinfo(np.int32).max).argmin(axis=1)
+        for row in np.flatnonzero(allowed.any(axis=1)):
+            corrections[block[row]] = trusted[best[row]]
+    return corrections
+
+
+def corpus_corrections(texts: List[str]) -> Dict[str, str]:
+    """The dictionary corrections normalize_documents applies to a corpus of texts"""
+    return build_corrections(_count_tokens(texts))
+
+
+def _match_case(original: str, corrected: str) -> str:
+    if original.isupper() and len(original) > 1:
+        return corrected.upper()
+    if original[0].isupper():
+        return corrected.capitalize()
+    return corrected
+
+
+# Set in each pool worker, so the corrections are pickled once per process
+_corrections: Dict[str, str] = {}
+
+
+def _set_corrections(corrections: Dict[str, str]):
+    global _corrections
+    _corrections = corrections
+
+
+def _normalize_word(original: str, corrections: Dict[str, str]) -> str:
+    token = repair_token(original)
+    token = corrections.get(token, token)
+    if token == original.lower():
+        return original
+    return _match_case(original, token)
+
+
+def normalize_text(text: str, corrections: Optional[Dict[str, str]] = None) -> str:
+    """
+    Clean one text while keeping its case, punctuation and line structure:
+    rejoin hyphenated line breaks, repair digit/letter confusions and apply
+    the corpus dictionary corrections.
+    """
+    corrections = _corrections if corrections is None else corrections
+    return WORD.sub(lambda match: _normalize_word(match.group(0), corrections), HYPHEN_BREAK.sub("", text))
+
+
+def _normalize_texts(texts: List[str]) -> List[str]:
+    return [normalize_text(text) for text in texts]
+
+
+def _batches(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def normalize_documents(documents: List[Document], workers: Optional[int] = None) -> List[Document]:
+    """
+    Normalize the OCR text of a corpus in place and return it.
+
+    Token counts over the whole corpus drive the dictionary correction, so the
+    corpus is processed in two passes; large corpora run both in a process pool.
+    """
+    texts = [document.page_content for document in documents]
+    workers = workers or os.cpu_count() or 1
+
+    if len(texts) < PARALLEL_THRESHOLD or workers == 1:
+        corrections = corpus_corrections(texts)
+        normalized = [normalize_text(text, corrections) for text in texts]
+    else:
+        batch_size = max(1, len(texts) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = sum(pool.map(_count_tokens, _batches(texts, batch_size)), Counter())
+        corrections = build_corrections(counts)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_corrections, initargs=(corrections,)) as pool:
+            normalized = [text for batch in pool.map(_normalize_texts, _batches(texts, batch_size)) for text in batch]
+
+    for document, text in zip(documents, normalized):
+        document.page_content = text
+    return documents
+
+
+def index_stats(token_lists: List[List[str]]) -> dict:
+    """Vocabulary size and posting-list entries of a lexical index over token_lists"""
+    vocabulary = set()
+    postings = 0
+    for tokens in token_lists:
+        unique = set(tokens)
+        vocabulary |= unique
+        postings += len(unique)
+    return {"vocabulary": len(vocabulary), "postings": postings}
+
+
+def report(path: Optional[str] = None, questions: Optional[List[str]] = None):
+    """Print how normalization changes the BM25 vocabulary, index size and latency"""
+    from langchain_community.retrievers import BM25Retriever
+
+    try:
+        from .corpus import DEFAULT_PATH, chunk_documents, load_articles
+    except ImportError:
+        from corpus import DEFAULT_PATH, chunk_documents, load_articles
+
+    def latency(retriever):
+        samples = []
+        for question in questions:
+            start = time.perf_counter()
+            retriever.invoke(question)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        return sum(samples) / len(samples) * 1000, samples[int(0.95 * (len(samples) - 1))] * 1000
+
+    raw_chunks = chunk_documents(load_articles(path or DEFAULT_PATH))
+    start = time.perf_counter()
+    clean_chunks = chunk_documents(normalize_documents(load_articles(path or DEFAULT_PATH)))
+    normalize_seconds = time.perf_counter() - start
+    questions = questions or [chunk.page_content[:80] for chunk in raw_chunks[:50]]
+
+    rows = [
+        ("raw (whitespace split)", raw_chunks, str.split),
+        ("case-folded + repaired tokens", raw_chunks, tokenize),
+        ("normalized corpus", clean_chunks, tokenize),
+    ]
+    print(f"normalized {len(raw_chunks)} chunks in {normalize_seconds:.2f}s")
+    print(f"{'index':<32} {'vocab':>8} {'postings':>9} {'build ms':>9} {'query ms':>9} {'p95 ms':>8}")
+    for name, chunks, preprocess in rows:
+        stats = index_stats([preprocess(chunk.page_content) for chunk in chunks])
+        start = time.perf_counter()
+        retriever = BM25Retriever.from_documents(chunks, preprocess_func=preprocess)
+        build_ms = (time.perf_counter() - start) * 1000
+        mean_ms, p95_ms = latency(retriever)
+        print(f"{name:<32} {stats['vocabulary']:>8} {stats['postings']:>9} {build_ms:>9.1f} {mean_ms:>9.2f} {p95_ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    # python ocr_normalize.py [article directory]; latency is measured over the synthetic questions
+    import json
+
+    dataset_path = os.path.join(os.path.dirname(__file__), "..", "data", "synthetic_dataset.json")
+    questions = None
+    if os.path.exists(dataset_path):
+        with open(dataset_path, "r") as f:
+            questions = [row["user_input"] for row in json.load(f)]
+    report(sys.argv[1] if len(sys.argv) > 1 else None, questions)
@@ -0,0 +1,292 @@
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from uuid import uuid4
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Handle import for both direct execution and module import
+try:
+    from .metrics import NODE_LATENCY, STEP_LATENCY
+except ImportError:
+    from metrics import NODE_LATENCY, STEP_LATENCY
+
+# TRAVELLM_PROFILE=1 profiles every request, =continuous samples all traffic
+# in the background. Otherwise a request is only profiled when PROFILE_TOKEN
+# is set and the request's X-Profile header carries that token.
+PROFILE_MODE = os.getenv("TRAVELLM_PROFILE", "").lower()
+PROFILE_HEADER = "X-Profile"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "..", "profiles"))
+# Oldest profile files are deleted beyond this many
+MAX_PROFILE_FILES = int(os.getenv("MAX_PROFILE_FILES", 200))
+
+# Per-request profiles sample fast for detail; continuous mode samples slowly
+# enough to leave in place on staging
+REQUEST_INTERVAL = 0.005
+CONTINUOUS_INTERVAL = 0.05
+CONTINUOUS_FLUSH_SECONDS = 60
+
+# Frames are labelled relative to the sys.path entry they were imported from
+_ROOTS = tuple(sorted({os.path.abspath(path) for path in sys.path if path}, key=len, reverse=True))
+
+
+def profiling_requested(headers: Dict[str, str]) -> bool:
+    """Whether a request should be profiled: TRAVELLM_PROFILE=1, or an X-Profile header matching PROFILE_TOKEN"""
+    if PROFILE_MODE in ("1", "true", "yes"):
+        return True
+    value = headers.get(PROFILE_HEADER, "")
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(value.encode(), PROFILE_TOKEN.encode())
+
+
+def rotate_profiles(directory: str = PROFILE_DIR, keep: int = MAX_PROFILE_FILES):
+    """Delete the oldest files in the profile directory beyond keep"""
+    try:
+        paths = [entry.path for entry in os.scandir(directory) if entry.is_file()]
+    except FileNotFoundError:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:max(0, len(paths) - keep)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for root in _ROOTS:
+        if filename.startswith(root):
+            filename = filename[len(root):].lstrip(os.sep)
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    """One stack as a root-first, semicolon-separated line, as flamegraph tools expect"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of selected threads (or every thread) at a fixed
+    interval from a background thread. Sampling rather than tracing keeps the
+    overhead independent of how many calls the profiled code makes.
+    """
+
+    def __init__(self, interval: float = REQUEST_INTERVAL, threads: Optional[set] = None):
+        self.interval = interval
+        self.threads = threads
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                self.samples += 1
+                for thread_id, frame in frames.items():
+                    if thread_id == own or (self.threads is not None and thread_id not in self.threads):
+                        continue
+                    self.stacks[_collapse(frame)] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def take(self) -> Tuple[Counter, int]:
+        """Return the stacks sampled so far and start counting afresh"""
+        with self._lock:
+            stacks, samples = self.stacks, self.samples
+            self.stacks, self.samples = Counter(), 0
+        return stacks, samples
+
+
+class _ThreadCollector(BaseCallbackHandler):
+    """Records every thread that runs part of the profiled graph (nodes, retrievers, LLM calls)"""
+
+    run_inline = True
+
+    def __init__(self, threads: set):
+        self.threads = threads
+
+    def _add(self, *args, **kwargs):
+        self.threads.add(threading.get_ident())
+
+    on_chain_start = on_retriever_start = on_chat_model_start = on_llm_start = on_tool_start = _add
+
+
+class _Timings:
+    def __init__(self):
+        self.nodes = defaultdict(float)
+        self.steps = defaultdict(float)
+
+
+_current_timings: ContextVar[Optional[_Timings]] = ContextVar("travellm_profile_timings", default=None)
+
+
+def _record_node(value, labels):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.nodes[labels["node"]] += value
+
+
+def _record_step(value, labels):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.steps[f"{labels['node']}/{labels['step']}"] += value
+
+
+# The node and step histograms already time every node; profiled runs
+# just keep their own copy of those timings
+NODE_LATENCY.subscribe(_record_node)
+STEP_LATENCY.subscribe(_record_step)
+
+
+def top_frames(stacks: Counter, limit: int = 15) -> list:
+    """Functions with the most samples at the top of the stack (self time)"""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    total = sum(leaves.values()) or 1
+    return [{"frame": frame, "samples": count, "share": count / total} for frame, count in leaves.most_common(limit)]
+
+
+def collapsed_text(stacks: Counter) -> str:
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(stacks.items()))
+
+
+def profile_invoke(runnable: Any, inputs: Any, config: Optional[dict] = None, interval: float = REQUEST_INTERVAL) -> Tuple[Any, dict]:
+    """
+    Invoke a runnable (normally the graph) under the sampling profiler.
+
+    Returns the result and a report with the wall time, the per-node and
+    per-step wall-time breakdown, the hottest functions and the collapsed
+    stacks of every thread that worked on this run.
+    """
+    threads = {threading.get_ident()}
+    config = dict(config or {})
+    config["callbacks"] = list(config.get("callbacks") or []) + [_ThreadCollector(threads)]
+
+    timings = _Timings()
+    token = _current_timings.set(timings)
+    profiler = SamplingProfiler(interval, threads).start()
+    start = time.perf_counter()
+    try:
+        result = runnable.invoke(inputs, config=config)
+    finally:
+        wall_time = time.perf_counter() - start
+        profiler.stop()
+        _current_timings.reset(token)
+
+    stacks, samples = profiler.take()
+    report = {
+        "id": uuid4().hex[:12],
+        "wall_time_s": wall_time,
+        "interval_s": interval,
+        "samples": samples,
+        "nodes": dict(timings.nodes),
+        "steps": dict(timings.steps),
+        "top_self": top_frames(stacks),
+        "collapsed": collapsed_text(stacks),
+    }
+    return result, report
+
+
+def write_profile(report: dict, directory: str = PROFILE_DIR) -> str:
+    """
+    Write a profile as <id>.collapsed (for flamegraph.pl, speedscope or
+    inferno) and <id>.json (everything else), keeping at most
+    MAX_PROFILE_FILES files in the directory. Returns the collapsed path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{report['id']}"
+    collapsed_path = os.path.join(directory, f"{name}.collapsed")
+    with open(collapsed_path, "w") as f:
+        f.write(report["collapsed"])
+    with open(os.path.join(directory, f"{name}.json"), "w") as f:
+        json.dump({key: value for key, value in report.items() if key != "collapsed"}, f, indent=2)
+    rotate_profiles(directory)
+    return collapsed_path
+
+
+class ContinuousProfiler:
+    """
+    Low-rate sampling of every thread in the process, written out as one
+    collapsed-stack file per flush period.
+    """
+
+    def __init__(self, interval: float = CONTINUOUS_INTERVAL, flush_seconds: float = CONTINUOUS_FLUSH_SECONDS, directory: str = PROFILE_DIR):
+        self.profiler = SamplingProfiler(interval)
+        self.flush_seconds = flush_seconds
+        self.directory = directory
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def flush(self) -> Optional[str]:
+        stacks, samples = self.profiler.take()
+        if not stacks:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"continuous_{datetime.now().strftime('%Y%m%d_%H%M%S')}.collapsed")
+        with open(path, "w") as f:
+            f.write(collapsed_text(stacks))
+        rotate_profiles(self.directory)
+        return path
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+    def start(self):
+        self.profiler.start()
+        self._thread = threading.Thread(target=self._run, name="continuous-profiler-flush", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.profiler.stop()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+if __name__ == "__main__":
+    # Profile one question end to end: python -m src.profiling "How can I combat a fever?"
+    try:
+        from .rag import graph
+    except ImportError:
+        from rag import graph
+
+    question = " ".join(sys.argv[1:]) or "How can I combat a fever?"
+    _, report = profile_invoke(graph, {"question": question})
+    print(f"wall time: {report['wall_time_s'] * 1000:.1f} ms, {report['samples']} samples")
+    for node, seconds in report["nodes"].items():
+        print(f"  {node:<40} {seconds * 1000:>8.1f} ms")
+    for step, seconds in report["steps"].items():
+        print(f"  {step:<40} {seconds * 1000:>8.1f} ms")
+    for frame in report["top_self"][:10]:
+        print(f"  {frame['share']:>6.1%}  {frame['frame']}")
+    print(f"collapsed stacks: {write_profile(report)}")
@@ -0,0 +1,314 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+from langchain_core.tracers.context import register_configure_hook
+
+# Handle import for both direct execution and module import
+try:
+    from .metrics import RATE_LIMIT_WAIT
+except ImportError:
+    from metrics import RATE_LIMIT_WAIT
+
+# The account's OpenAI limits, shared by every model client in the process
+REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 500))
+TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", 200_000))
+# Largest burst, in seconds' worth of the per-minute limits
+BURST_SECONDS = 10.0
+# Set to a file path to share one bucket between processes (app, eval, ingestion)
+STATE_PATH = os.getenv("OPENAI_RATE_LIMIT_STATE")
+
+# Lower number wins: queued interactive calls always go before eval and
+# ingestion. Batch classes also leave a share of each bucket untouched, so
+# a user's request arriving mid-batch finds capacity waiting for it.
+PRIORITIES = {"interactive": 0, "eval": 1, "ingestion": 2}
+RESERVE = {"interactive": 0.0, "eval": 0.25, "ingestion": 0.5}
+
+# Chat calls are charged their prompt plus this many output tokens up front,
+# then corrected with the real usage once the response arrives
+OUTPUT_TOKENS_ESTIMATE = 500
+CHARS_PER_TOKEN = 4
+
+_default_priority = os.getenv("OPENAI_PRIORITY", "interactive")
+_priority: ContextVar[Optional[str]] = ContextVar("travellm_rate_limit_priority", default=None)
+_pending_tokens: ContextVar[Optional[int]] = ContextVar("travellm_rate_limit_tokens", default=None)
+
+
+def set_default_priority(name: str):
+    """Priority class for every OpenAI call in this process, e.g. "eval" for an eval script"""
+    global _default_priority
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority {name!r}, expected one of {sorted(PRIORITIES)}")
+    _default_priority = name
+
+
+@contextmanager
+def priority(name: str):
+    """Run the calls made inside the block (and the threads it starts) at another priority"""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority {name!r}, expected one of {sorted(PRIORITIES)}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get() or _default_priority
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class _MemoryBuckets:
+    """Request and token buckets for this process"""
+
+    def __init__(self, capacities: Tuple[float, float]):
+        self.levels = list(capacities)
+        self.updated = time.monotonic()
+
+    @contextmanager
+    def state(self):
+        yield self
+
+
+class _FileBuckets:
+    """Request and token buckets kept in a file and updated under an exclusive lock, shared by processes"""
+
+    def __init__(self, path: str, capacities: Tuple[float, float]):
+        self.path = path
+        self.capacities = capacities
+
+    @contextmanager
+    def state(self):
+        import fcntl
+
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                saved = json.loads(raw) if raw else {}
+                # Wall-clock time, since processes do not share a monotonic clock
+                self.levels = saved.get("levels", list(self.capacities))
+                self.updated = saved.get("updated", time.time())
+                yield self
+                f.seek(0)
+                f.truncate()
+                json.dump({"levels": self.levels, "updated": self.updated}, f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class TokenBucketRateLimiter(BaseRateLimiter):
+    """
+    Client-side limiter for an OpenAI account's request and token limits,
+    with priority classes.
+
+    Each call takes one request and its estimated tokens from two buckets that
+    refill continuously at the per-minute limits. Callers that have to wait
+    queue by priority (then arrival), and lower classes may not dip into the
+    share of the buckets reserved for higher ones. Token estimates are
+    corrected with real usage afterwards, so the buckets can go into debt
+    when a response was longer than expected.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = TOKENS_PER_MINUTE,
+        burst_seconds: float = BURST_SECONDS,
+        state_path: Optional[str] = STATE_PATH,
+        check_every: float = 0.05,
+    ):
+        self.rates = (requests_per_minute / 60, tokens_per_minute / 60)
+        self.capacities = (max(1.0, self.rates[0] * burst_seconds), max(1.0, self.rates[1] * burst_seconds))
+        self.check_every = check_every
+        self._clock = time.time if state_path else time.monotonic
+        self._buckets = _FileBuckets(state_path, self.capacities) if state_path else _MemoryBuckets(self.capacities)
+        self._condition = threading.Condition()
+        self._queue: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+
+    def _refill(self, buckets):
+        now = self._clock()
+        elapsed = max(0.0, now - buckets.updated)
+        buckets.levels = [min(capacity, level + rate * elapsed) for level, rate, capacity in zip(buckets.levels, self.rates, self.capacities)]
+        buckets.updated = now
+
+    def usable_tokens(self, priority: Optional[str] = None) -> float:
+        """Most tokens one call at a priority can take without dipping into the share reserved for higher ones"""
+        return self.capacities[1] * (1 - RESERVE[priority or current_priority()])
+
+    def _try_consume(self, tokens: int, reserve: float) -> float:
+        """Take one request and tokens if the buckets allow it; otherwise return how long to wait"""
+        # A single call larger than the usable share of a bucket could never
+        # fit, so it only waits for that share. Batch callers split their work
+        # below usable_tokens() instead (see RateLimitedEmbeddings).
+        needed = [min(amount, capacity * (1 - reserve)) for amount, capacity in zip((1.0, float(tokens)), self.capacities)]
+        with self._buckets.state() as buckets:
+            self._refill(buckets)
+            shortfall = [
+                amount - (level - capacity * reserve)
+                for amount, level, capacity in zip(needed, buckets.levels, self.capacities)
+            ]
+            if all(missing <= 0 for missing in shortfall):
+                buckets.levels = [level - amount for level, amount in zip(buckets.levels, (1.0, float(tokens)))]
+                return 0.0
+            return max(missing / rate for missing, rate in zip(shortfall, self.rates) if missing > 0)
+
+    def adjust(self, tokens: int):
+        """Charge (or refund, if negative) tokens after the real usage of a call is known"""
+        if not tokens:
+            return
+        with self._buckets.state() as buckets:
+            self._refill(buckets)
+            buckets.levels[1] = min(self.capacities[1], buckets.levels[1] - tokens)
+        with self._condition:
+            self._condition.notify_all()
+
+    def acquire(self, *, blocking: bool = True, tokens: Optional[int] = None, priority: Optional[str] = None) -> bool:
+        """
+        Wait until a call may go ahead.
+
+        Chat models call this without tokens: the estimate made from the prompt
+        in RateLimitCallbackHandler.on_chat_model_start is used instead.
+        """
+        priority = priority or current_priority()
+        if tokens is None:
+            tokens = _pending_tokens.get() or OUTPUT_TOKENS_ESTIMATE
+            _pending_tokens.set(None)
+        reserve = RESERVE[priority]
+
+        start = time.perf_counter()
+        ticket = (PRIORITIES[priority], next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    wait = self._try_consume(tokens, reserve) if self._queue[0] == ticket else self.check_every
+                    if wait == 0:
+                        break
+                    if not blocking:
+                        return False
+                    self._condition.wait(timeout=min(wait, 1.0))
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+
+        RATE_LIMIT_WAIT.observe(time.perf_counter() - start, priority=priority)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True, tokens: Optional[int] = None, priority: Optional[str] = None) -> bool:
+        # Waiting happens in a worker thread so async callers queue with everyone else;
+        # to_thread copies the context, so priority and the token estimate carry over
+        return await asyncio.to_thread(self.acquire, blocking=blocking, tokens=tokens, priority=priority)
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Embeddings client that takes its requests and tokens from the shared limiter first.
+
+    Batches larger than the caller's usable share of the token bucket are sent
+    as several requests that each wait for their own tokens, so an ingestion
+    batch never drives the bucket below the share reserved for live traffic.
+    """
+
+    def __init__(self, embeddings: Embeddings, limiter: TokenBucketRateLimiter):
+        self.embeddings = embeddings
+        self.limiter = limiter
+
+    def _batches(self, texts: List[str]):
+        """Split texts into (batch, estimated tokens) that each fit the usable share"""
+        limit = self.limiter.usable_tokens()
+        batch, tokens = [], 0
+        for text in texts:
+            estimate = estimate_tokens(text)
+            if batch and tokens + estimate > limit:
+                yield batch, tokens
+                batch, tokens = [], 0
+            batch.append(text)
+            tokens += estimate
+        if batch:
+            yield batch, tokens
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for batch, tokens in self._batches(texts):
+            self.limiter.acquire(tokens=tokens)
+            vectors.extend(self.embeddings.embed_documents(batch))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        self.limiter.acquire(tokens=estimate_tokens(text))
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for batch, tokens in self._batches(texts):
+            await self.limiter.aacquire(tokens=tokens)
+            vectors.extend(await self.embeddings.aembed_documents(batch))
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await self.limiter.aacquire(tokens=estimate_tokens(text))
+        return await self.embeddings.aembed_query(text)
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """
+    Estimates a chat call's tokens from its prompt before the model acquires
+    from the limiter, and settles the difference with the real usage afterwards.
+    """
+
+    # Must run in the caller's context so acquire() sees the estimate
+    run_inline = True
+
+    def __init__(self, limiter: TokenBucketRateLimiter):
+        self.limiter = limiter
+        self._charged: Dict[UUID, int] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        prompt_tokens = sum(estimate_tokens(str(message.content)) for batch in messages for message in batch)
+        estimate = prompt_tokens + OUTPUT_TOKENS_ESTIMATE
+        self._charged[run_id] = estimate
+        _pending_tokens.set(estimate)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        charged = self._charged.pop(run_id, None)
+        if charged is None:
+            return
+        used = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    used += usage.get("total_tokens", 0)
+        if used:
+            self.limiter.adjust(used - charged)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._charged.pop(run_id, None)
+
+
+openai_rate_limiter = TokenBucketRateLimiter()
+
+_rate_limit_callback_var: ContextVar[Optional[BaseCallbackHandler]] = ContextVar(
+    "travellm_rate_limit_callback", default=RateLimitCallbackHandler(openai_rate_limiter)
+)
+register_configure_hook(_rate_limit_callback_var, inheritable=True)
@@ -0,0 +1,126 @@
+import os
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStoreRetriever
+
+# Retriever used by retrieve_local unless a run overrides it with
+# config={"configurable": {"retriever": "<name>"}}. Set TRAVELLM_RETRIEVER=sharded
+# to search the per-period shards (see data/shards.json) instead.
+DEFAULT_RETRIEVER = os.getenv("TRAVELLM_RETRIEVER", "hybrid")
+
+# The graph collapses results to one chunk per reprint cluster, so it asks
+# for this many times a retriever's usual results and keeps the first k
+# distinct ones: reprints free their slots for other evidence
+OVERFETCH = 2
+
+
+def _basic():
+    from .retriever import retriever
+    return retriever
+
+
+def _multi_query():
+    from .multiquery_retriever import multiquery_retriever
+    return multiquery_retriever
+
+
+def _bm25():
+    from .bm25_retriever import bm25_retriever
+    return bm25_retriever
+
+
+def _ensemble():
+    from .ensemble_retriever import ensemble_retriever
+    return ensemble_retriever
+
+
+def _hybrid():
+    # Same inputs as the ensemble it replaced: question rephrasings and the top 5 per search
+    from .hybrid_retriever import hybrid_retriever
+    return hybrid_retriever(k=5, multi_query=True)
+
+
+def _sharded():
+    from .shards import build_sharded_retriever
+    return build_sharded_retriever()
+
+
+# Factories rather than instances so a process only builds (and, for BM25,
+# holds in memory) the retrievers it actually uses
+RETRIEVER_FACTORIES: Dict[str, Callable[[], BaseRetriever]] = {
+    "basic": _basic,
+    "multi_query": _multi_query,
+    "bm25": _bm25,
+    "ensemble": _ensemble,
+    "hybrid": _hybrid,
+    "sharded": _sharded,
+}
+
+
+def register_retriever(name: str, factory: Callable[[], BaseRetriever]):
+    """Make a retriever selectable by name in the graph and the eval scripts"""
+    RETRIEVER_FACTORIES[name] = factory
+    get_retriever.cache_clear()
+    get_overfetching_retriever.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_retriever(name: str = DEFAULT_RETRIEVER) -> BaseRetriever:
+    if name not in RETRIEVER_FACTORIES:
+        raise ValueError(f"Unknown retriever {name!r}, expected one of {sorted(RETRIEVER_FACTORIES)}")
+    return RETRIEVER_FACTORIES[name]()
+
+
+def overfetching(retriever: BaseRetriever, factor: int = OVERFETCH) -> Tuple[BaseRetriever, Optional[int]]:
+    """
+    Copy of a retriever that returns factor times its usual number of
+    results, and that usual number.
+
+    Retrievers without a fixed result count (ensemble, multi-query, which
+    return the union of what their parts find) are returned unchanged, with None.
+    """
+    if isinstance(retriever, VectorStoreRetriever):
+        k = retriever.search_kwargs.get("k", 4)
+        return retriever.model_copy(update={"search_kwargs": {**retriever.search_kwargs, "k": k * factor}}), k
+    k = getattr(retriever, "k", None)
+    if isinstance(k, int):
+        return retriever.model_copy(update={"k": k * factor}), k
+    return retriever, None
+
+
+def without_query_expansion(retriever: BaseRetriever) -> BaseRetriever:
+    """
+    Copy of a retriever that only searches the query as given, without asking
+    the LLM for alternative phrasings first.
+
+    Multi-query retrievers are replaced by the retriever they wrap, ensembles
+    have their parts stripped, and the hybrid and sharded retrievers lose
+    their query_generator. Anything else is returned unchanged.
+    """
+    from langchain.retrievers import EnsembleRetriever
+    from langchain.retrievers.multi_query import MultiQueryRetriever
+
+    if isinstance(retriever, MultiQueryRetriever):
+        return retriever.retriever
+    if isinstance(retriever, EnsembleRetriever):
+        return retriever.model_copy(update={"retrievers": [without_query_expansion(part) for part in retriever.retrievers]})
+    if getattr(retriever, "query_generator", None) is not None:
+        return retriever.model_copy(update={"query_generator": None})
+    return retriever
+
+
+@lru_cache(maxsize=None)
+def get_overfetching_retriever(name: str = DEFAULT_RETRIEVER, expand_queries: bool = True) -> Tuple[BaseRetriever, Optional[int]]:
+    """
+    The named retriever over-fetching by OVERFETCH, and how many results to keep after deduplication.
+
+    Args:
+        name: Registered retriever name
+        expand_queries: Keep the retriever's LLM query rephrasings, if it has any
+    """
+    retriever = get_retriever(name)
+    if not expand_queries:
+        retriever = without_query_expansion(retriever)
+    return overfetching(retriever)
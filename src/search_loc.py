@@ -1,7 +1,17 @@
+import os
 import requests
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 
+# Handle import for both direct execution and module import
+try:
+    from .metrics import observe_step
+except ImportError:
+    from metrics import observe_step
+
+# Overridable so offline runs can point at a local stand-in server
+LOC_BASE_URL = "https://www.loc.gov/collections/chronicling-america/"
+
 @dataclass
 class LOCSearchParams:
     """Parameters for Library of Congress Chronicling America search"""
@@ -25,7 +35,7 @@ def search_loc(params: LOCSearchParams, max_results: int = 10) -> Dict[str, Any]
     Returns:
         Dictionary containing search results and metadata
     """
-    base_url = "https://www.loc.gov/collections/chronicling-america/"
+    base_url = os.getenv("LOC_BASE_URL", LOC_BASE_URL)
     
     # Build query parameters
     query_params = []
@@ -67,10 +77,10 @@ def search_loc(params: LOCSearchParams, max_results: int = 10) -> Dict[str, Any]
     url = f"{base_url}?{query_string}"
     
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
+        with observe_step("loc_http"):
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            data = response.json()
         
         # Limit results if specified
         if max_results and "results" in data:
@@ -85,12 +95,14 @@ def search_loc(params: LOCSearchParams, max_results: int = 10) -> Dict[str, Any]
         print(f"Failed to parse JSON response: {e}")
         return {"results": []}
 
-def search_1861_articles(query: list[str], state: Optional[str] = None, max_results: int = 5) -> List[Dict[str, Any]]:
+def search_articles(query: list[str], start_year: int, end_year: int, state: Optional[str] = None, max_results: int = 5) -> List[Dict[str, Any]]:
     """
-    Convenience function to search for 1861 articles specifically
+    Search for articles published between start_year and end_year (inclusive)
     
     Args:
         query: Search terms
+        start_year: First year of the date range
+        end_year: Last year of the date range
         state: Optional state filter
         max_results: Maximum number of results
     
@@ -99,8 +111,8 @@ def search_1861_articles(query: list[str], state: Optional[str] = None, max_resu
     """
     params = LOCSearchParams(
         query="+".join(query),
-        start_date="1861-01-01",
-        end_date="1861-12-31",
+        start_date=f"{start_year}-01-01",
+        end_date=f"{end_year}-12-31",
         display_level="page",
         search_operation="AND",
         location_state=state
@@ -109,6 +121,20 @@ def search_1861_articles(query: list[str], state: Optional[str] = None, max_resu
     results = search_loc(params, max_results)
     return results.get("results", [])
 
+def search_1861_articles(query: list[str], state: Optional[str] = None, max_results: int = 5) -> List[Dict[str, Any]]:
+    """
+    Convenience function to search for 1861 articles specifically
+    
+    Args:
+        query: Search terms
+        state: Optional state filter
+        max_results: Maximum number of results
+    
+    Returns:
+        List of article results
+    """
+    return search_articles(query, 1861, 1861, state, max_results)
+
 def parse_loc_article(article: Dict[str, Any]) -> Dict[str, Any]:
     """
     Parse a LOC article into a dictionary
@@ -0,0 +1,364 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Annotated, Any, Dict, List, Optional
+from uuid import uuid4
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+
+from .dedup import collapse_duplicates
+from .metrics import CACHE_HITS, instrument_node
+from .models import embedding_model
+from .rag import State, era_label, generator_chain, retrieve_local, search_loc_with_llm, search_local
+from .retrievers import DEFAULT_RETRIEVER
+from .shards import resolve_era
+
+# Sessions idle longer than this are dropped, and at most MAX_SESSIONS are
+# kept, using at most SESSION_MEMORY_MB of serialized state between them (a
+# session with full evidence and its embeddings takes about 1 MB)
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 30 * 60))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", 500))
+SESSION_MEMORY_MB = float(os.getenv("SESSION_MEMORY_MB", 128))
+
+# Per-session bounds: earlier turns replayed to the model, documents kept as
+# evidence, and how many of them are put in front of the model each turn
+MAX_HISTORY_TURNS = 5
+MAX_EVIDENCE = 30
+EVIDENCE_K = 10
+
+# A follow-up is treated as a new topic, and retrieved from scratch, only when
+# it brings more than MAX_NEW_TERMS key terms the session's evidence lacks
+# and those are most of its key terms
+MAX_NEW_TERMS = 2
+MIN_TERM_COVERAGE = 0.5
+
+STOPWORDS = set("""
+a about after again all also am an and any are as at be been before being but by can could did do does
+doing done for from had has have how i if in into is it its just like me more most my no not now of on
+or our out over said say says so some such tell than that the their them then there these they this
+those through to too up very was we were what when where which while who whom why will with would you
+your yours anything something else folks people news latest happening going
+""".split())
+
+_WORD = re.compile(r"[a-z]{3,}")
+
+
+def key_terms(text: str) -> set:
+    """Lowercased content words of a question or document"""
+    return {word for word in _WORD.findall(text.lower()) if word not in STOPWORDS}
+
+
+def ordered_terms(text: str, terms: set) -> List[str]:
+    """The given terms in the order they first appear in text"""
+    return list(dict.fromkeys(word for word in _WORD.findall(text.lower()) if word in terms))
+
+
+def keep_recent_turns(existing: List[BaseMessage], new: List[BaseMessage]) -> List[BaseMessage]:
+    """Reducer appending a turn's messages while keeping only the last MAX_HISTORY_TURNS turns"""
+    return (existing + new)[-2 * MAX_HISTORY_TURNS:]
+
+
+class SessionState(State):
+    history: Annotated[List[BaseMessage], keep_recent_turns]
+    # Documents retrieved in earlier turns, with their embeddings, newest first
+    evidence: List[Document]
+    evidence_embeddings: List[List[float]]
+    evidence_era: str
+    question_embedding: List[float]
+    # "full", "incremental" or "reuse", decided per turn by plan_retrieval,
+    # and for "incremental" the key terms the evidence lacks
+    retrieval: str
+    new_terms: List[str]
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    In-memory checkpointer with bounded memory: keeps only the latest
+    checkpoints of each session, and evicts sessions that have been idle
+    longer than ttl_seconds, then least recently used ones while there are
+    more than max_sessions or they hold more than max_bytes of serialized
+    state. The most recently used session is never evicted for size.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        keep_checkpoints: int = 2,
+        max_bytes: int = int(SESSION_MEMORY_MB * 1024 * 1024),
+    ):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.keep_checkpoints = keep_checkpoints
+        self.max_bytes = max_bytes
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def _touch(self, thread_id: str):
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def _measure(self, thread_id: str):
+        """Record how many bytes of serialized checkpoints, writes and channel values a session holds"""
+        size = 0
+        for checkpoints in self.storage.get(thread_id, {}).values():
+            for checkpoint, metadata, _ in checkpoints.values():
+                size += len(checkpoint[1]) + len(metadata[1])
+        for key, (_, blob) in self.blobs.items():
+            if key[0] == thread_id:
+                size += len(blob)
+        for key, writes in self.writes.items():
+            if key[0] == thread_id:
+                size += sum(len(write[2][1]) for write in writes.values())
+        self._sizes[thread_id] = size
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by all sessions"""
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def evict(self):
+        """Drop expired sessions, then the least recently used ones beyond max_sessions or max_bytes"""
+        with self._lock:
+            now = time.monotonic()
+            total = sum(self._sizes.values())
+            while self._last_used:
+                thread_id, last_used = next(iter(self._last_used.items()))
+                over_size = total > self.max_bytes and len(self._last_used) > 1
+                if now - last_used <= self.ttl_seconds and len(self._last_used) <= self.max_sessions and not over_size:
+                    break
+                total -= self._sizes.get(thread_id, 0)
+                self.delete_thread(thread_id)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        """Forget all but the latest checkpoints of a session, with their writes and unused blobs"""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_checkpoints:
+            return
+        ordered = sorted(checkpoints)
+        for checkpoint_id in ordered[:-self.keep_checkpoints]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        live = set()
+        for checkpoint_id in ordered[-self.keep_checkpoints:]:
+            checkpoint = self.serde.loads_typed(checkpoints[checkpoint_id][0])
+            live.update(checkpoint["channel_versions"].items())
+        for key in [key for key in self.blobs if key[:2] == (thread_id, checkpoint_ns)]:
+            if (key[2], key[3]) not in live:
+                del self.blobs[key]
+
+    def get_tuple(self, config: RunnableConfig):
+        with self._lock:
+            self.evict()
+            return super().get_tuple(config)
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions):
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._prune(thread_id, config["configurable"]["checkpoint_ns"])
+            self._measure(thread_id)
+            self._touch(thread_id)
+            self.evict()
+            return result
+
+    def put_writes(self, config: RunnableConfig, writes, task_id: str, task_path: str = ""):
+        with self._lock:
+            result = super().put_writes(config, writes, task_id, task_path)
+            if config["configurable"]["thread_id"] in self._last_used:
+                self._measure(config["configurable"]["thread_id"])
+            return result
+
+    def delete_thread(self, thread_id: str):
+        with self._lock:
+            self._last_used.pop(thread_id, None)
+            self._sizes.pop(thread_id, None)
+            super().delete_thread(thread_id)
+
+
+def cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+embeddings = embedding_model()
+
+
+@instrument_node
+def plan_retrieval(state: SessionState) -> SessionState:
+    """
+    Decide how much retrieval a turn needs without calling the LLM: reuse the
+    session's evidence if it mentions every key term of the question, fetch
+    only the missing evidence if the question adds a few new terms, otherwise
+    start over.
+    """
+    question = state["question"]
+    era = era_label(*resolve_era(question, state.get("era")))
+    evidence = state.get("evidence") or []
+
+    terms = key_terms(question)
+    # Terms of earlier questions count as known: the evidence was retrieved for them
+    known = set()
+    for document in evidence + (state.get("loc_context") or []):
+        known |= key_terms(document.page_content)
+    for message in state.get("history") or []:
+        if isinstance(message, HumanMessage):
+            known |= key_terms(message.content)
+    missing = terms - known
+    coverage = 1 - len(missing) / len(terms) if terms else 1.0
+
+    if not evidence or era != state.get("evidence_era"):
+        retrieval = "full"
+    elif not missing:
+        retrieval = "reuse"
+        CACHE_HITS.inc(cache="session")
+    elif len(missing) <= MAX_NEW_TERMS or coverage >= MIN_TERM_COVERAGE:
+        retrieval = "incremental"
+    else:
+        retrieval = "full"
+
+    update = {
+        "retrieval": retrieval,
+        "new_terms": ordered_terms(question, missing) if retrieval == "incremental" else [],
+        "question_embedding": embeddings.embed_query(question),
+    }
+    if retrieval != "full" and len(state.get("evidence_embeddings") or []) != len(evidence):
+        # Sessions seeded by start_session are only embedded once a follow-up needs them
+        update["evidence_embeddings"] = embeddings.embed_documents([document.page_content for document in evidence])
+    return update
+
+
+def merge_evidence(state: SessionState, documents: List[Document], replace: bool = False) -> SessionState:
+    """Add newly retrieved documents (and their embeddings) in front of the session's evidence"""
+    evidence = [] if replace else list(state.get("evidence") or [])
+    evidence_embeddings = [] if replace else list(state.get("evidence_embeddings") or [])
+
+    seen = {document.page_content for document in evidence}
+    new = collapse_duplicates([document for document in documents if document.page_content not in seen])
+    new_embeddings = embeddings.embed_documents([document.page_content for document in new]) if new else []
+
+    return {
+        "evidence": (new + evidence)[:MAX_EVIDENCE],
+        "evidence_embeddings": (new_embeddings + evidence_embeddings)[:MAX_EVIDENCE],
+        "evidence_era": era_label(*resolve_era(state["question"], state.get("era"))),
+    }
+
+
+@instrument_node
+def remember_evidence(state: SessionState) -> SessionState:
+    """After a full retrieval the new results replace the session's evidence"""
+    return merge_evidence(state, state["local_context"], replace=True)
+
+
+@instrument_node
+def retrieve_incremental(state: SessionState, config: RunnableConfig) -> SessionState:
+    """
+    Retrieve only the evidence a follow-up adds: search for the key terms the
+    session's evidence lacks, as given, without LLM query rephrasings
+    """
+    query = " ".join(state.get("new_terms") or []) or state["question"]
+    name = config.get("configurable", {}).get("retriever", DEFAULT_RETRIEVER)
+    return merge_evidence(state, search_local(query, name, state.get("era"), expand_queries=False))
+
+
+@instrument_node
+def generate_turn(state: SessionState) -> SessionState:
+    """Answer from the session's most relevant evidence, with the earlier turns as history"""
+    evidence = state.get("evidence") or []
+    ranked = sorted(
+        zip(evidence, state.get("evidence_embeddings") or []),
+        key=lambda pair: cosine(state["question_embedding"], pair[1]),
+        reverse=True,
+    )
+    local_context = [document for document, _ in ranked[:EVIDENCE_K]]
+
+    _, end_year = resolve_era(state["question"], state.get("era"))
+    response = generator_chain.invoke({
+        "year": end_year,
+        "history": state.get("history") or [],
+        "query": state["question"],
+        "local_context": local_context,
+        "loc_context": state.get("loc_context") or [],
+    })
+    return {
+        "response": response,
+        "local_context": local_context,
+        "history": [HumanMessage(state["question"]), AIMessage(response)],
+    }
+
+
+checkpointer = BoundedMemorySaver()
+
+# Follow-ups skip straight to generation ("reuse") or fetch only what is
+# missing ("incremental"); only new topics run the full retrieval pipeline
+session_builder = StateGraph(SessionState)
+session_builder.add_node(plan_retrieval)
+session_builder.add_node(retrieve_local)
+session_builder.add_node(search_loc_with_llm)
+session_builder.add_node(remember_evidence)
+session_builder.add_node(retrieve_incremental)
+session_builder.add_node(generate_turn)
+session_builder.add_edge(START, "plan_retrieval")
+session_builder.add_conditional_edges(
+    "plan_retrieval",
+    lambda state: state["retrieval"],
+    {"full": "retrieve_local", "incremental": "retrieve_incremental", "reuse": "generate_turn"},
+)
+session_builder.add_edge("retrieve_local", "search_loc_with_llm")
+session_builder.add_edge("search_loc_with_llm", "remember_evidence")
+session_builder.add_edge("remember_evidence", "generate_turn")
+session_builder.add_edge("retrieve_incremental", "generate_turn")
+session_builder.add_edge("generate_turn", END)
+session_graph = session_builder.compile(checkpointer=checkpointer)
+
+
+def start_session(result: dict, era: Optional[str] = None) -> str:
+    """
+    Open a session from a finished run of the single-question graph (rag.graph)
+    and return its id.
+
+    First questions go through the coalesced graph and only become a session
+    once answered, so they cost nothing extra; the evidence is embedded on the
+    first follow-up, in plan_retrieval.
+    """
+    session_id = uuid4().hex
+    question = result["question"]
+    values = {
+        "question": question,
+        "evidence": result["local_context"][:MAX_EVIDENCE],
+        "evidence_embeddings": [],
+        "evidence_era": era_label(*resolve_era(question, era)),
+        "local_context": result["local_context"],
+        "loc_context": result["loc_context"],
+        "response": result["response"],
+        "history": [HumanMessage(question), AIMessage(result["response"])],
+    }
+    if era:
+        values["era"] = era
+    session_graph.update_state({"configurable": {"thread_id": session_id}}, values, as_node="generate_turn")
+    return session_id
+
+
+def ask(session_id: str, question: str, era: Optional[str] = None, **configurable: Any) -> dict:
+    """Run one turn of a session and return its final state"""
+    inputs = {"question": question}
+    if era:
+        inputs["era"] = era
+    return session_graph.invoke(inputs, config={"configurable": {"thread_id": session_id, **configurable}})
+
+
+if __name__ == "__main__":
+    for question in ["How can I combat a fever?", "And what about in Kentucky?", "How should I treat a fever?"]:
+        result = ask("demo", question)
+        print(f"[{result['retrieval']}] {question}\n{result['response']}\n")
@@ -0,0 +1,273 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import Runnable
+
+# Handle import for both direct execution and module import
+try:
+    from .corpus import load_and_chunk_documents
+    from .hybrid_retriever import HybridRetriever, hybrid_retriever, query_generator, query_variants, reciprocal_rank_fusion
+    from .models import COLLECTION_NAME
+except ImportError:
+    from corpus import load_and_chunk_documents
+    from hybrid_retriever import HybridRetriever, hybrid_retriever, query_generator, query_variants, reciprocal_rank_fusion
+    from models import COLLECTION_NAME
+
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "shards.json")
+
+# Shard the indexes by "year" or "decade"
+SHARD_GRANULARITY = os.getenv("SHARD_GRANULARITY", "year")
+
+# Era used when a question names no year and the caller gives no explicit era
+DEFAULT_ERA = os.getenv("DEFAULT_ERA", "1861")
+
+# AmericanStories covers 1780-1960
+FIRST_YEAR, LAST_YEAR = 1780, 1960
+
+YEAR_RE = re.compile(r"\b(1[789]\d\d)(s)?\b")
+# A number is read as a year when date context comes before it ("in 1862",
+# "since May 1861", "1861-1865"). Without that it must not be followed by a
+# noun and must fall inside the ingested years: "Were 1800 troops sent?" is a
+# count, not the year 1800.
+DATE_CUE_RE = re.compile(
+    r"(?:\b1[789]\d\ds?\s*(?:[-–]|to|and|through|till|until)\s*$)|\b(?:in|since|during|until|till|before|after|from|through|year|circa|"
+    r"jan(?:uary)?|feb(?:ruary)?|march|april|may|june|july|aug(?:ust)?|sept(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+    r"\.?,?\s+(?:\d{1,2}(?:st|nd|rd|th)?,?\s+)?$",
+    re.IGNORECASE,
+)
+COUNTED_NOUN_RE = re.compile(r"\s*[a-z]", re.IGNORECASE)
+RANGE_WORD_RE = re.compile(r"\s*(?:to|and|or|through|till|until)\b", re.IGNORECASE)
+ERA_RE = re.compile(r"^\s*(\d{4})(s)?\s*(?:-\s*(\d{4}))?\s*$")
+
+
+def shard_key(date: Optional[str], granularity: str = SHARD_GRANULARITY) -> str:
+    """Shard an article belongs to, from its YYYY-MM-DD date: "1861" or "1860s"."""
+    year = (date or "")[:4]
+    if not year.isdigit():
+        return "unknown"
+    return f"{year[:3]}0s" if granularity == "decade" else year
+
+
+def shard_years(shard: str) -> Tuple[int, int]:
+    """First and last year covered by a shard."""
+    if shard.endswith("s"):
+        start = int(shard[:4])
+        return start, start + 9
+    return int(shard), int(shard)
+
+
+def collection_name(shard: str) -> str:
+    return f"{COLLECTION_NAME}_{shard}"
+
+
+def parse_era(era: str) -> Tuple[int, int]:
+    """Parse "1861", "1860s" or "1861-1865" into an inclusive year range."""
+    match = ERA_RE.match(era)
+    if not match:
+        raise ValueError(f"Unrecognised era {era!r}; use e.g. '1861', '1860s' or '1861-1865'")
+    start = int(match.group(1))
+    if match.group(2):
+        return start, start + 9
+    end = int(match.group(3)) if match.group(3) else start
+    if end < start:
+        raise ValueError(f"Era {era!r} ends before it starts")
+    return start, end
+
+
+def _mentions_year(question: str, match: "re.Match", first: int, last: int) -> bool:
+    """Whether a YEAR_RE match is a year (rather than a count) worth routing on"""
+    if match.group(2) or DATE_CUE_RE.search(question[:match.start()]):
+        return True
+    after = question[match.end():]
+    is_count = COUNTED_NOUN_RE.match(after) and not RANGE_WORD_RE.match(after)
+    return not is_count and first <= int(match.group(1)) <= last
+
+
+def corpus_years(path: str = MANIFEST_PATH) -> Tuple[int, int]:
+    """Years covered by the ingested shards, or all of AmericanStories before the first ingestion."""
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    return _corpus_years(path, mtime)
+
+
+@lru_cache(maxsize=8)
+def _corpus_years(path: str, mtime: Optional[float]) -> Tuple[int, int]:
+    spans = [shard_years(name) for name, stats in load_manifest(path)["shards"].items() if name != "unknown" and stats.get("chunks")]
+    if not spans:
+        return FIRST_YEAR, LAST_YEAR
+    return min(start for start, _ in spans), max(end for _, end in spans)
+
+
+def resolve_era(question: str, era: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Year range a question is about: the explicit era if given, otherwise the
+    span of years (or decades) mentioned in the question, otherwise DEFAULT_ERA.
+
+    Mentions with date context ("in 1865") may fall anywhere in 1780-1960;
+    bare numbers ("1862 news") only count inside the ingested corpus's years.
+    """
+    if era:
+        return parse_era(era)
+    first, last = corpus_years()
+    years = []
+    for match in YEAR_RE.finditer(question):
+        year = int(match.group(1))
+        if FIRST_YEAR <= year <= LAST_YEAR and _mentions_year(question, match, first, last):
+            years.extend([year, year + 9] if match.group(2) else [year])
+    if years:
+        return min(years), max(years)
+    return parse_era(DEFAULT_ERA)
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, Any]:
+    """Load the shard manifest written at ingestion time."""
+    if not os.path.exists(path):
+        return {"granularity": SHARD_GRANULARITY, "shards": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict[str, Any], path: str = MANIFEST_PATH):
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def update_shard_stats(manifest: Dict[str, Any], shard: str, chunks: List[Document], source: str, stored: Optional[int] = None):
+    """
+    Fold a freshly ingested batch of chunks into the shard's statistics.
+    stored is how many of them were embedded, if near-duplicates were skipped.
+    """
+    stats = manifest["shards"].setdefault(shard, {
+        "collection": collection_name(shard),
+        "articles": 0,
+        "chunks": 0,
+        "stored_chunks": 0,
+        "start_date": None,
+        "end_date": None,
+        "newspapers": [],
+        "sources": [],
+    })
+    dates = [chunk.metadata["date"] for chunk in chunks if chunk.metadata.get("date")]
+    stats["articles"] += len({chunk.metadata.get("source") for chunk in chunks})
+    stats["chunks"] += len(chunks)
+    stats["stored_chunks"] = stats.get("stored_chunks", 0) + (len(chunks) if stored is None else stored)
+    if dates:
+        stats["start_date"] = min(filter(None, [stats["start_date"], *dates]))
+        stats["end_date"] = max(filter(None, [stats["end_date"], *dates]))
+    stats["newspapers"] = sorted(
+        set(stats["newspapers"]) | {chunk.metadata["newspaper_name"] for chunk in chunks if chunk.metadata.get("newspaper_name")}
+    )
+    source = os.path.abspath(source)
+    if source not in stats["sources"]:
+        stats["sources"].append(source)
+
+
+def route_shards(manifest: Dict[str, Any], question: str, era: Optional[str] = None) -> List[str]:
+    """
+    Shards to search for a question: those overlapping its resolved era. Falls
+    back to DEFAULT_ERA's shards, and only then to every shard, when nothing
+    overlaps, so a question about 1861 never scans the whole archive.
+    """
+    shards = {name: stats for name, stats in manifest["shards"].items() if stats.get("chunks")}
+
+    def overlapping(start, end):
+        return sorted(
+            name for name in shards
+            if name != "unknown" and shard_years(name)[0] <= end and shard_years(name)[1] >= start
+        )
+
+    return overlapping(*resolve_era(question, era)) or overlapping(*parse_era(DEFAULT_ERA)) or sorted(shards)
+
+
+@lru_cache(maxsize=None)
+def shard_chunks(shard: str, sources: Tuple[str, ...], granularity: str) -> List[Document]:
+    """Chunks of one shard, rebuilt from the source directories recorded at ingestion."""
+    chunks = []
+    for source in sources:
+        chunks.extend(
+            chunk for chunk in load_and_chunk_documents(source)
+            if shard_key(chunk.metadata.get("date"), granularity) == shard
+        )
+    return chunks
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    Routes a question to the shards covering its era, searches them (and every
+    query variant) in parallel, and fuses the ranked lists with reciprocal
+    rank fusion.
+
+    Pass an explicit era with retriever.invoke(question, era="1860s").
+    """
+
+    manifest: Dict[str, Any]
+    shard_retriever: Callable[[str], BaseRetriever]
+    """Builds (or returns a cached) retriever for one shard."""
+    query_generator: Optional[Runnable] = None
+    """Optional runnable turning a question into alternative phrasings, run once per question."""
+    k: int = 5
+    c: int = 60
+    max_workers: int = 8
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, era: Optional[str] = None
+    ) -> List[Document]:
+        shards = route_shards(self.manifest, query, era)
+        queries = query_variants(query, self.query_generator, run_manager)
+        retrievers = {shard: self.shard_retriever(shard) for shard in shards}
+
+        # Every shard searches the same variants: embed each one once, in one
+        # request, instead of once per shard
+        vectors: Dict[str, List[float]] = {}
+        hybrid = [retriever for retriever in retrievers.values() if isinstance(retriever, HybridRetriever)]
+        if hybrid:
+            vectors = dict(zip(queries, hybrid[0].embeddings.embed_documents(queries)))
+
+        def search(shard, variant):
+            retriever = retrievers[shard]
+            kwargs = {"embedding": vectors[variant]} if isinstance(retriever, HybridRetriever) else {}
+            return retriever.invoke(variant, config={"callbacks": run_manager.get_child()}, **kwargs)
+
+        tasks = [(shard, variant) for shard in shards for variant in queries]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tasks)) or 1) as pool:
+            # copy_context keeps metrics and callback context in the worker threads
+            futures = [pool.submit(copy_context().run, search, shard, variant) for shard, variant in tasks]
+            ranked_lists = [future.result() for future in futures]
+
+        return reciprocal_rank_fusion(ranked_lists, self.k, self.c)
+
+
+def build_sharded_retriever(manifest: Optional[Dict[str, Any]] = None) -> ShardedRetriever:
+    """
+    Sharded counterpart of the hybrid retriever: per shard, lexical and vector
+    search over its collection fused 50/50, with multi-query expansion and
+    query embedding done once per question rather than once per shard.
+    """
+    from threading import Lock
+
+    manifest = manifest or load_manifest()
+    retrievers: Dict[str, BaseRetriever] = {}
+    lock = Lock()
+
+    def shard_retriever(shard: str) -> BaseRetriever:
+        # Shards are only connected to once first queried. Postgres shards are
+        # searched in one SQL query; other stores fall back to an in-process
+        # BM25 index rebuilt from the shard's source directories.
+        with lock:
+            if shard not in retrievers:
+                stats = manifest["shards"][shard]
+                retrievers[shard] = hybrid_retriever(
+                    stats["collection"],
+                    load_documents=lambda: shard_chunks(shard, tuple(stats["sources"]), manifest["granularity"]),
+                    k=5,
+                )
+            return retrievers[shard]
+
+    return ShardedRetriever(manifest=manifest, shard_retriever=shard_retriever, query_generator=query_generator())
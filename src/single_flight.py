@@ -0,0 +1,263 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import CACHE_HITS
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivially different spellings share one key"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def question_key(input: Dict[str, Any]) -> str:
+    """Default single-flight key: the normalized question (and era, if given) of a graph input"""
+    question = normalize_question(input["question"])
+    return f"{input['era']}|{question}" if input.get("era") else question
+
+
+def config_key(config: Optional[Dict[str, Any]]) -> str:
+    """
+    The part of a run's config that can change its result: the configurable
+    values (retriever, thread_id, ...). Callbacks, tags and metadata only
+    observe a run, so calls that differ in those still share one execution.
+    """
+    configurable = (config or {}).get("configurable") or {}
+    return repr(sorted((name, repr(value)) for name, value in configurable.items()))
+
+
+class _Call:
+    """One in-flight execution that any number of callers can wait on"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.chunks = []
+        self.done = False
+        self.result = None
+        self.error = None
+        self.subscribers = 0
+
+    def finish(self, result=None, error=None):
+        with self.condition:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.condition.notify_all()
+
+    def wait(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _AsyncCall:
+    """Asyncio counterpart of _Call, driven by a single producer task"""
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls to a runnable into one execution.
+
+    Callers asking the same (normalized) question while a run for it is still
+    in flight wait on that run and share its result instead of starting their
+    own. Nothing is kept once the run finishes, so results are never stale.
+
+    Args:
+        runnable: Anything exposing invoke/ainvoke/stream/astream (e.g. the compiled graph)
+        key_func: Maps a runnable input to its coalescing key; the configurable
+            part of the config is always added to it, so runs that pick a
+            different retriever (or session) are never shared
+    """
+
+    def __init__(self, runnable, key_func: Callable[[Dict[str, Any]], str] = question_key):
+        self.runnable = runnable
+        self.key_func = key_func
+        self.executions = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, _Call] = {}
+        self._async_calls: Dict[Any, _AsyncCall] = {}
+
+    def _join(self, calls: Dict[Any, Any], key, factory):
+        """Return (call, is_leader) for key, registering a new call if none is in flight"""
+        with self._lock:
+            call = calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                CACHE_HITS.inc(cache="single_flight")
+                call.subscribers += 1
+                return call, False
+            call = factory()
+            call.subscribers = 1
+            calls[key] = call
+            self.executions += 1
+            return call, True
+
+    def _forget(self, calls: Dict[Any, Any], key, call):
+        with self._lock:
+            if calls.get(key) is call:
+                del calls[key]
+
+    def _key(self, kind: str, input: Dict[str, Any], config, kwargs=None):
+        key = (kind, self.key_func(input), config_key(config))
+        return key + (repr(sorted(kwargs.items())),) if kwargs is not None else key
+
+    @staticmethod
+    def _share(result):
+        # Hand each caller its own top-level dict so one caller's edits don't leak
+        return dict(result) if isinstance(result, dict) else result
+
+    def invoke(self, input: Dict[str, Any], config=None, **kwargs):
+        key = self._key("invoke", input, config)
+        call, leader = self._join(self._calls, key, _Call)
+        if not leader:
+            return self._share(call.wait())
+
+        try:
+            result = self.runnable.invoke(input, config, **kwargs)
+        except BaseException as e:
+            call.finish(error=e)
+            raise
+        else:
+            call.finish(result=result)
+            return self._share(result)
+        finally:
+            self._forget(self._calls, key, call)
+
+    def stream(self, input: Dict[str, Any], config=None, **kwargs):
+        """
+        Stream chunks from a shared execution.
+
+        The execution runs in a background thread and every caller (the first
+        one included) replays its buffered chunks, so a caller that stops
+        iterating early does not cut the stream short for the others. The
+        execution stops once every caller has gone away.
+        """
+        key = self._key("stream", input, config, kwargs)
+        call, leader = self._join(self._calls, key, _Call)
+        if leader:
+            threading.Thread(
+                target=self._produce, args=(key, call, input, config, kwargs), daemon=True
+            ).start()
+
+        index = 0
+        try:
+            while True:
+                with call.condition:
+                    call.condition.wait_for(lambda: index < len(call.chunks) or call.done)
+                    pending = call.chunks[index:]
+                    finished = call.done
+                for chunk in pending:
+                    yield chunk
+                index += len(pending)
+                if finished and index == len(call.chunks):
+                    break
+            if call.error is not None:
+                raise call.error
+        finally:
+            with self._lock:
+                call.subscribers -= 1
+
+    def _produce(self, key, call: _Call, input, config, kwargs):
+        try:
+            for chunk in self.runnable.stream(input, config, **kwargs):
+                with self._lock:
+                    # Everyone stopped listening: retire the call so late
+                    # arrivals start a fresh run instead of a truncated one
+                    if call.subscribers == 0:
+                        if self._calls.get(key) is call:
+                            del self._calls[key]
+                        break
+                with call.condition:
+                    call.chunks.append(chunk)
+                    call.condition.notify_all()
+        except BaseException as e:
+            call.finish(error=e)
+        else:
+            call.finish()
+        finally:
+            self._forget(self._calls, key, call)
+
+    async def ainvoke(self, input: Dict[str, Any], config=None, **kwargs):
+        """
+        Async invoke. A caller that is cancelled stops waiting without
+        cancelling the shared run, unless it was the last one waiting on it.
+        """
+        key = self._key("invoke", input, config)
+        call, leader = self._join(self._async_calls, key, _AsyncCall)
+        if leader:
+            call.task = asyncio.ensure_future(self.runnable.ainvoke(input, config, **kwargs))
+            call.task.add_done_callback(lambda _: self._forget(self._async_calls, key, call))
+
+        try:
+            result = await asyncio.shield(call.task)
+        finally:
+            self._leave(key, call)
+        return self._share(result)
+
+    async def astream(self, input: Dict[str, Any], config=None, **kwargs):
+        """Async version of stream with the same sharing and cancellation rules"""
+        key = self._key("stream", input, config, kwargs)
+        call, leader = self._join(self._async_calls, key, _AsyncCall)
+        if leader:
+            call.task = asyncio.ensure_future(self._aproduce(key, call, input, config, kwargs))
+
+        index = 0
+        try:
+            while True:
+                async with call.condition:
+                    await call.condition.wait_for(lambda: index < len(call.chunks) or call.done)
+                    pending = call.chunks[index:]
+                    finished = call.done
+                for chunk in pending:
+                    yield chunk
+                index += len(pending)
+                if finished and index == len(call.chunks):
+                    break
+            if call.error is not None:
+                raise call.error
+        finally:
+            self._leave(key, call)
+
+    async def _aproduce(self, key, call: _AsyncCall, input, config, kwargs):
+        try:
+            async for chunk in self.runnable.astream(input, config, **kwargs):
+                async with call.condition:
+                    call.chunks.append(chunk)
+                    call.condition.notify_all()
+        except asyncio.CancelledError:
+            call.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            call.error = e
+        finally:
+            self._forget(self._async_calls, key, call)
+            async with call.condition:
+                call.done = True
+                call.condition.notify_all()
+
+    def _leave(self, key, call: _AsyncCall):
+        """Drop one waiter, cancelling the shared task once nobody is left"""
+        with self._lock:
+            call.subscribers -= 1
+            cancel = call.subscribers == 0 and call.task is not None and not call.task.done()
+            if cancel and self._async_calls.get(key) is call:
+                # Retire the call right away: a caller arriving before the task
+                # has finished cancelling must start a fresh run, not join this one
+                del self._async_calls[key]
+        if cancel:
+            call.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        """Number of real executions and of calls served by an in-flight execution"""
+        return {"executions": self.executions, "coalesced": self.coalesced}
@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+
+from langchain_core.documents import Document
+
+from src import dedup
+from src.dedup import collapse_duplicates, deduplicate, find_clusters
+
+STORY = (
+    "The steamer Star of the West arrived at New York yesterday from Charleston harbor, "
+    "having been fired upon by the batteries on Morris Island while attempting to reach Fort Sumter."
+)
+# Another paper's copy: different heading, OCR noise and line breaks
+REPRINT = (
+    "LATEST NEWS. The steamer Star of tbe West arrived at New York yesterday from Charleston\n"
+    "harbor, having been fired upon by the batteries on Morris Island while attempting to reach Fort Sumter."
+)
+OTHER = "Flour sold at two dollars the barrel in the Baltimore market on Saturday, and wheat was firm."
+
+
+def articles():
+    return [
+        Document(page_content=REPRINT, metadata={"source": "b.json", "newspaper_name": "The Sun"}),
+        Document(page_content=OTHER, metadata={"source": "c.json", "newspaper_name": "The Sun"}),
+        Document(page_content=STORY, metadata={"source": "a.json", "newspaper_name": "Evening Star"}),
+    ]
+
+
+class FindClustersTest(unittest.TestCase):
+    def test_reprints_share_a_cluster(self):
+        self.assertEqual(find_clusters(articles()), [[0, 2], [1]])
+
+
+class DeduplicateTest(unittest.TestCase):
+    def test_keeps_the_cleanest_copy_and_links_every_paper(self):
+        documents = articles()
+        kept = deduplicate(documents)
+
+        self.assertEqual([document.page_content for document in kept], [STORY, OTHER])
+        self.assertEqual(documents[0].metadata["cluster_id"], documents[2].metadata["cluster_id"])
+        self.assertNotEqual(documents[0].metadata["cluster_id"], documents[1].metadata["cluster_id"])
+        self.assertEqual([document.metadata["canonical"] for document in documents], [False, True, True])
+        self.assertEqual(kept[0].metadata["duplicate_sources"], ["b.json", "a.json"])
+        self.assertEqual(kept[0].metadata["duplicate_newspapers"], ["Evening Star", "The Sun"])
+        self.assertNotIn("duplicate_sources", kept[1].metadata)
+
+    def test_keep_duplicates_returns_every_chunk(self):
+        self.assertEqual(len(deduplicate(articles(), keep_duplicates=True)), 3)
+
+
+class CollapseDuplicatesTest(unittest.TestCase):
+    def test_collapses_by_cluster_id_without_hashing(self):
+        documents = articles()
+        deduplicate(documents)
+        with mock.patch.object(dedup, "minhash", side_effect=AssertionError("hashed")):
+            collapsed = collapse_duplicates(documents)
+        self.assertEqual([document.page_content for document in collapsed], [REPRINT, OTHER])
+
+    def test_collapses_by_minhash_without_cluster_id(self):
+        collapsed = collapse_duplicates(articles())
+        self.assertEqual([document.page_content for document in collapsed], [REPRINT, OTHER])
+
+    def test_stops_at_k_distinct_documents(self):
+        collapsed = collapse_duplicates(articles(), k=1)
+        self.assertEqual([document.page_content for document in collapsed], [REPRINT])
+
+    def test_unclustered_copy_of_a_clustered_result_is_dropped(self):
+        clustered = Document(page_content=STORY, metadata={"cluster_id": "a.json#1"})
+        collapsed = collapse_duplicates([clustered, Document(page_content=REPRINT)])
+        self.assertEqual(collapsed, [clustered])
+
+
+if __name__ == "__main__":
+    unittest.main()
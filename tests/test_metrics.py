@@ -0,0 +1,85 @@
+import unittest
+
+from src.metrics import LLM_COST, LLM_TOKENS, Registry, record_llm_usage
+
+
+def values(metric) -> dict:
+    return {(name, tuple(sorted(labels.items()))): value for name, labels, value in metric.collect()}
+
+
+class RenderTest(unittest.TestCase):
+    def test_counter_lines_and_label_escaping(self):
+        registry = Registry()
+        counter = registry.counter("test_total", "A test counter", ["node"])
+        counter.inc(node='say "hi"\\now\n')
+        counter.inc(2, node="plain")
+
+        self.assertEqual(
+            registry.render(),
+            "# HELP test_total A test counter\n"
+            "# TYPE test_total counter\n"
+            'test_total{node="plain"} 2\n'
+            'test_total{node="say \\"hi\\"\\\\now\\n"} 1\n',
+        )
+
+    def test_histogram_buckets_sum_and_count(self):
+        registry = Registry()
+        histogram = registry.histogram("test_seconds", "A test histogram", ["node"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, node="a")
+        histogram.observe(0.5, node="a")
+        histogram.observe(2.0, node="a")
+
+        self.assertEqual(
+            registry.render(),
+            "# HELP test_seconds A test histogram\n"
+            "# TYPE test_seconds histogram\n"
+            'test_seconds_bucket{node="a",le="0.1"} 1\n'
+            'test_seconds_bucket{node="a",le="1"} 2\n'
+            'test_seconds_bucket{node="a",le="+Inf"} 3\n'
+            'test_seconds_sum{node="a"} 2.55\n'
+            'test_seconds_count{node="a"} 3\n',
+        )
+
+    def test_subscribers_see_raw_observations(self):
+        registry = Registry()
+        histogram = registry.histogram("test_seconds", "A test histogram", ["node"])
+        seen = []
+        histogram.subscribe(lambda value, labels: seen.append((value, labels)))
+        histogram.observe(0.3, node="a")
+        self.assertEqual(seen, [(0.3, {"node": "a"})])
+
+
+class LlmUsageTest(unittest.TestCase):
+    def test_cached_and_uncached_input_are_split(self):
+        node = "test_record_llm_usage"
+        tokens_before, cost_before = values(LLM_TOKENS), values(LLM_COST)
+        record_llm_usage(node, "gpt-4o-mini-2024-07-18", {
+            "input_tokens": 1500,
+            "output_tokens": 200,
+            "input_token_details": {"cache_read": 1024},
+        })
+        tokens, cost = values(LLM_TOKENS), values(LLM_COST)
+
+        def delta(kind):
+            key = ("travellm_llm_tokens_total", (("model", "gpt-4o-mini-2024-07-18"), ("node", node), ("type", kind)))
+            return tokens.get(key, 0) - tokens_before.get(key, 0)
+
+        self.assertEqual(delta("input"), 476)
+        self.assertEqual(delta("cached_input"), 1024)
+        self.assertEqual(delta("output"), 200)
+
+        cost_key = ("travellm_llm_cost_usd_total", (("model", "gpt-4o-mini-2024-07-18"),))
+        expected = (476 * 0.15 + 1024 * 0.075 + 200 * 0.60) / 1_000_000
+        self.assertAlmostEqual(cost[cost_key] - cost_before.get(cost_key, 0), expected)
+
+    def test_missing_cache_details_count_as_uncached(self):
+        node = "test_record_llm_usage_uncached"
+        record_llm_usage(node, "gpt-4o", {"input_tokens": 100, "output_tokens": 10})
+        tokens = values(LLM_TOKENS)
+        key = lambda kind: ("travellm_llm_tokens_total", (("model", "gpt-4o"), ("node", node), ("type", kind)))
+        self.assertEqual(tokens[key("input")], 100)
+        self.assertEqual(tokens[key("cached_input")], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
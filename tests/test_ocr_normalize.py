@@ -0,0 +1,38 @@
+import unittest
+from collections import Counter
+
+from src.ocr_normalize import build_corrections, normalize_text, tokenize
+
+
+class RepairTest(unittest.TestCase):
+    def test_ordinals_and_numbers_are_kept(self):
+        self.assertEqual(tokenize("the 1st Regiment, 2d Corps, 10th Ward, 1861"), ["the", "1st", "regiment", "2d", "corps", "10th", "ward", "1861"])
+        self.assertEqual(normalize_text("The 1st Regiment"), "The 1st Regiment")
+
+    def test_digit_letter_confusions(self):
+        self.assertEqual(tokenize("1t is 1n tbe G0vernment"), ["it", "is", "in", "the", "government"])
+
+    def test_identifiers_are_kept(self):
+        # Only digits between letters are misread letters
+        self.assertEqual(tokenize("Company A1 and I0 street"), ["company", "a1", "and", "i0", "street"])
+        self.assertEqual(normalize_text("Company A1 of the 6th"), "Company A1 of the 6th")
+
+    def test_hyphenated_line_breaks_are_rejoined(self):
+        self.assertEqual(normalize_text("the de-\nclaration of war"), "the declaration of war")
+
+
+class CorrectionsTest(unittest.TestCase):
+    def test_rare_words_map_to_frequent_neighbours(self):
+        counts = Counter({"government": 40, "goverment": 1, "regiment": 20, "regimemt": 1, "troops": 3, "tro0ps": 1})
+        corrections = build_corrections(counts)
+        self.assertEqual(corrections["goverment"], "government")
+        self.assertEqual(corrections["regimemt"], "regiment")
+        # Not alphabetic, and "troops" is not RATIO times more frequent
+        self.assertNotIn("tro0ps", corrections)
+
+    def test_case_is_preserved(self):
+        self.assertEqual(normalize_text("The Goverment", {"goverment": "government"}), "The Government")
+
+
+if __name__ == "__main__":
+    unittest.main()
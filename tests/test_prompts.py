@@ -0,0 +1,113 @@
+import os
+import unittest
+
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+
+from src.prompts import generator_prompt, loc_planner_prompt
+
+# What the model receives, written out in full so any change to the wording,
+# order or layout of the prompts shows up here
+EXPECTED_PERSONA_1861 = """You are speaking in the year 1861, as a well-informed and articulate U.S. citizen of that time. You do not know anything beyond 1861. You are not an AI. You are not a narrator or historian. You are **a real person** living in 1861.
+
+You answer as if you are having a direct conversation with someone who has just arrived in your town. Speak **in the first person**, using **present tense**. Use **"I"**, **"we"**, and **"you"** freely, as someone would when giving advice, sharing information, or telling a story. For example:
+
+- “I keep a tin of horehound and peppermint on hand for cough—it does a fair job when the weather turns damp.”
+- “I reckon Mr. Lincoln is earnest in his cause, though folks in my town are split about the war.”
+- “We read this morning that Richmond has fallen quiet again, though how long that will last, no one can say.”
+- “The ladies here are organizing a sewing circle to make bandages for the wounded—every Thursday in the church hall.”
+- “The price of flour's gone up again—two dollars for a barrel, and that's if you can even find one.”
+
+You must base your answers on the provided newspaper articles and context. Your tone is conversational, natural, and grounded in your lived experience.
+
+Do not mention that this is fictional or for educational purposes—stay completely in character.
+"""
+
+EXPECTED_CONTEXT = """
+# LOCAL NEWSPAPER ARTICLES:
+['Quinine is recommended for fever and ague.']
+
+# LIBRARY OF CONGRESS ARTICLES:
+['Title: Fever remedies']
+
+# QUERY:
+How can I treat a fever?
+"""
+
+EXPECTED_PLANNER_SYSTEM = (
+    "You are helping to search for historical newspaper articles. \n"
+    "        Based on the user's question and the local search results, decide how to search the Library of Congress.\n"
+    "        \n"
+    "        Use the search_newspaper_articles_tool to find relevant articles. Choose search terms that will help answer the question.\n"
+    "        Focus on key nouns, people, places, events, or concepts mentioned in the question."
+)
+
+EXPECTED_PLANNER_HUMAN = (
+    "Era: 1861\nQuestion: How can I treat a fever?\nLocal results found: 3\n\n"
+    "Search for additional articles to help answer this question."
+)
+
+SAMPLE = {
+    "year": 1861,
+    "query": "How can I treat a fever?",
+    "local_context": ["Quinine is recommended for fever and ague."],
+    "loc_context": ["Title: Fever remedies"],
+}
+
+
+class GeneratorPromptTest(unittest.TestCase):
+    def test_rendered_messages(self):
+        messages = generator_prompt.format_messages(**SAMPLE)
+
+        self.assertEqual([message.type for message in messages], ["system", "human"])
+        self.assertEqual(messages[0].content, EXPECTED_PERSONA_1861)
+        self.assertEqual(messages[1].content, EXPECTED_CONTEXT)
+
+    def test_history_sits_between_instructions_and_context(self):
+        history = [HumanMessage("Is there news of the war?"), AIMessage("Fort Sumter has fallen.")]
+        messages = generator_prompt.format_messages(history=history, **SAMPLE)
+
+        self.assertEqual([message.type for message in messages], ["system", "human", "ai", "human"])
+        self.assertEqual(messages[0].content, EXPECTED_PERSONA_1861)
+        self.assertEqual(messages[1:3], history)
+        self.assertEqual(messages[3].content, EXPECTED_CONTEXT)
+
+    def test_system_prefix_is_request_independent(self):
+        other = {
+            "year": 1861,
+            "query": "What news from Washington?",
+            "local_context": ["Troops are gathering at Washington."],
+            "loc_context": [],
+        }
+        self.assertEqual(generator_prompt.format_messages(**SAMPLE)[0], generator_prompt.format_messages(**other)[0])
+
+    def test_generator_chain_answers_with_plain_text(self):
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        from src.rag import generator_chain
+
+        self.assertIs(generator_chain.first, generator_prompt)
+        self.assertIsInstance(generator_chain.last, StrOutputParser)
+
+        # The real prompt and parser around a stand-in model
+        model = FakeListChatModel(responses=["I reckon quinine is your best hope."])
+        chain = generator_chain.first | model | generator_chain.last
+        self.assertEqual(chain.invoke(SAMPLE), "I reckon quinine is your best hope.")
+
+
+class PlannerPromptTest(unittest.TestCase):
+    def test_rendered_messages(self):
+        messages = loc_planner_prompt.format_messages(era="1861", question="How can I treat a fever?", local_count=3)
+
+        self.assertEqual([message.type for message in messages], ["system", "human"])
+        self.assertEqual(messages[0].content, EXPECTED_PLANNER_SYSTEM)
+        self.assertEqual(messages[1].content, EXPECTED_PLANNER_HUMAN)
+
+    def test_system_prefix_is_request_independent(self):
+        first = loc_planner_prompt.format_messages(era="1861", question="a", local_count=1)[0]
+        second = loc_planner_prompt.format_messages(era="1865", question="b", local_count=2)[0]
+        self.assertEqual(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import threading
+import time
+import unittest
+
+from langchain_core.embeddings import Embeddings
+
+from src.rate_limit import RateLimitedEmbeddings, TokenBucketRateLimiter, priority
+
+
+def small_limiter(tokens_per_second: float = 1000, burst_seconds: float = 1.0) -> TokenBucketRateLimiter:
+    # Plenty of requests, so only the token bucket matters
+    return TokenBucketRateLimiter(
+        requests_per_minute=600_000,
+        tokens_per_minute=tokens_per_second * 60,
+        burst_seconds=burst_seconds,
+        state_path=None,
+        check_every=0.01,
+    )
+
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self, limiter: TokenBucketRateLimiter):
+        self.limiter = limiter
+        self.batches = []
+        self.levels = []
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        self.levels.append(self.limiter._buckets.levels[1])
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text))]
+
+
+class ReserveTest(unittest.TestCase):
+    def test_lower_classes_leave_the_reserve_untouched(self):
+        limiter = small_limiter()
+        # Ingestion may use half of the 1000-token bucket, eval three quarters
+        self.assertTrue(limiter.acquire(blocking=False, tokens=500, priority="ingestion"))
+        self.assertFalse(limiter.acquire(blocking=False, tokens=100, priority="ingestion"))
+        self.assertTrue(limiter.acquire(blocking=False, tokens=200, priority="eval"))
+        self.assertFalse(limiter.acquire(blocking=False, tokens=100, priority="eval"))
+        # Interactive calls may use everything that is left
+        self.assertTrue(limiter.acquire(blocking=False, tokens=300, priority="interactive"))
+
+    def test_large_embedding_batches_stay_above_the_reserve(self):
+        limiter = small_limiter(tokens_per_second=20_000, burst_seconds=0.05)  # 1000-token bucket
+        recorder = RecordingEmbeddings(limiter)
+        embeddings = RateLimitedEmbeddings(recorder, limiter)
+        texts = ["x" * 396] * 30  # 100 tokens each, 3000 in total
+
+        with priority("ingestion"):
+            vectors = embeddings.embed_documents(texts)
+
+        self.assertEqual(len(vectors), len(texts))
+        self.assertEqual(sum(recorder.batches), len(texts))
+        self.assertTrue(all(size * 100 <= limiter.usable_tokens("ingestion") for size in recorder.batches))
+        # After taking each sub-batch the bucket still holds the interactive reserve
+        self.assertTrue(all(level >= 500 - 1e-6 for level in recorder.levels), recorder.levels)
+
+
+class PriorityTest(unittest.TestCase):
+    def test_interactive_calls_go_first(self):
+        limiter = small_limiter()
+        limiter.acquire(tokens=1000, priority="interactive")
+        finished = []
+
+        def call(name):
+            limiter.acquire(tokens=100, priority=name)
+            finished.append(name)
+
+        ingestion = threading.Thread(target=call, args=("ingestion",))
+        ingestion.start()
+        time.sleep(0.05)
+        interactive = threading.Thread(target=call, args=("interactive",))
+        interactive.start()
+        ingestion.join(5)
+        interactive.join(5)
+
+        self.assertEqual(finished, ["interactive", "ingestion"])
+
+
+if __name__ == "__main__":
+    unittest.main()
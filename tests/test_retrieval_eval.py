@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "eval"))
+from retrieval_eval import score_ranking
+
+T, F = True, False
+
+
+class ScoreRankingTest(unittest.TestCase):
+    def test_one_chunk_covering_every_reference_is_perfect(self):
+        scores = score_ranking(np.array([[T, T], [F, F], [F, F]]), [1, 3])
+        self.assertEqual(scores["recall@3"], 1.0)
+        self.assertAlmostEqual(scores["ndcg@3"], 1.0)
+        self.assertAlmostEqual(scores["ndcg@1"], 1.0)
+        self.assertEqual(scores["mrr"], 1.0)
+
+    def test_repeat_matches_earn_nothing(self):
+        # A reprint of the first chunk at rank 2 must not lift nDCG above 1
+        scores = score_ranking(np.array([[T, F], [T, F], [F, T]]), [3])
+        self.assertEqual(scores["recall@3"], 1.0)
+        self.assertLessEqual(scores["ndcg@3"], 1.0)
+        ideal = 1 + 1 / np.log2(3)
+        self.assertAlmostEqual(scores["ndcg@3"], (1 + 1 / np.log2(4)) / ideal)
+
+    def test_late_hits_score_below_one(self):
+        scores = score_ranking(np.array([[F, F], [T, T]]), [2])
+        self.assertEqual(scores["mrr"], 0.5)
+        self.assertAlmostEqual(scores["ndcg@2"], 1 / np.log2(3))
+
+    def test_no_matches(self):
+        scores = score_ranking(np.zeros((0, 2), dtype=bool), [1])
+        self.assertEqual(scores, {"mrr": 0.0, "recall@1": 0.0, "ndcg@1": 0.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import time
+import unittest
+from typing import TypedDict
+from unittest import mock
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+from src import sessions
+from src.sessions import BoundedMemorySaver, plan_retrieval, retrieve_incremental
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.documents = 0
+
+    def embed_documents(self, texts):
+        self.documents += len(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+FEVER = Document(page_content="Quinine and bark are the surest remedy for fever and ague this season.")
+
+
+def session(question, **values):
+    state = {
+        "question": question,
+        "evidence": [FEVER],
+        "evidence_embeddings": [[1.0, 1.0]],
+        "evidence_era": "1861",
+        "history": [HumanMessage("How can I combat a fever?"), AIMessage("Quinine, friend.")],
+    }
+    state.update(values)
+    return state
+
+
+class PlanRetrievalTest(unittest.TestCase):
+    def setUp(self):
+        self.embeddings = CountingEmbeddings()
+        for patcher in (
+            mock.patch.object(sessions, "embeddings", self.embeddings),
+            mock.patch("src.shards.corpus_years", return_value=(1861, 1861)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_known_terms_reuse_the_evidence(self):
+        update = plan_retrieval(session("Is quinine the remedy for fever?"))
+        self.assertEqual(update["retrieval"], "reuse")
+        self.assertEqual(update["new_terms"], [])
+
+    def test_a_few_new_terms_are_fetched_incrementally(self):
+        update = plan_retrieval(session("And what about fever in Kentucky?"))
+        self.assertEqual(update["retrieval"], "incremental")
+        self.assertEqual(update["new_terms"], ["kentucky"])
+
+    def test_new_topic_starts_over(self):
+        update = plan_retrieval(session("Which regiments marched through Baltimore toward Washington yesterday?"))
+        self.assertEqual(update["retrieval"], "full")
+        self.assertEqual(update["new_terms"], [])
+
+    def test_new_era_or_no_evidence_starts_over(self):
+        self.assertEqual(plan_retrieval(session("Is quinine good for a fever in 1865?"))["retrieval"], "full")
+        self.assertEqual(plan_retrieval(session("Is quinine good for a fever?", evidence=[]))["retrieval"], "full")
+
+    def test_seeded_evidence_is_embedded_on_the_first_follow_up(self):
+        update = plan_retrieval(session("Is quinine good for a fever?", evidence_embeddings=[]))
+        self.assertEqual(len(update["evidence_embeddings"]), 1)
+        self.assertEqual(self.embeddings.documents, 1)
+
+        # A full retrieval replaces the evidence anyway, so it isn't embedded
+        self.embeddings.documents = 0
+        update = plan_retrieval(session("Which regiments marched through Baltimore toward Washington?", evidence_embeddings=[]))
+        self.assertNotIn("evidence_embeddings", update)
+        self.assertEqual(self.embeddings.documents, 0)
+
+    def test_incremental_retrieval_searches_only_the_new_terms(self):
+        found = Document(page_content="Kentucky physicians report the fever has reached Louisville.")
+        with mock.patch.object(sessions, "embeddings", CountingEmbeddings()), \
+                mock.patch.object(sessions, "search_local", return_value=[found]) as search:
+            update = retrieve_incremental(
+                session("And what about fever in Kentucky?", new_terms=["kentucky"]), {"configurable": {"retriever": "bm25"}}
+            )
+        search.assert_called_once_with("kentucky", "bm25", None, expand_queries=False)
+        self.assertEqual(update["evidence"], [found, FEVER])
+
+
+class Value(TypedDict):
+    value: str
+
+
+def tiny_graph(checkpointer):
+    builder = StateGraph(Value)
+    builder.add_node("echo", lambda state: {"value": state["value"] + "!"})
+    builder.add_edge(START, "echo")
+    builder.add_edge("echo", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def run(graph, thread_id, value="x"):
+    return graph.invoke({"value": value}, config={"configurable": {"thread_id": thread_id}})
+
+
+class BoundedMemorySaverTest(unittest.TestCase):
+    def test_least_recently_used_sessions_go_first(self):
+        saver = BoundedMemorySaver(max_sessions=2)
+        graph = tiny_graph(saver)
+        for thread_id in ["a", "b", "a", "c"]:
+            run(graph, thread_id)
+        self.assertEqual(set(saver.storage), {"a", "c"})
+        self.assertFalse(any(key[0] == "b" for key in saver.blobs))
+
+    def test_idle_sessions_expire(self):
+        saver = BoundedMemorySaver(ttl_seconds=60)
+        graph = tiny_graph(saver)
+        run(graph, "old")
+        run(graph, "new")
+        saver._last_used["old"] = time.monotonic() - 61
+        saver.evict()
+        self.assertEqual(set(saver.storage), {"new"})
+
+    def test_sessions_are_evicted_by_size(self):
+        # Each of these sessions holds about 30 kB: two fit, three don't
+        saver = BoundedMemorySaver(max_bytes=70_000)
+        graph = tiny_graph(saver)
+        for thread_id in ["a", "b", "c"]:
+            run(graph, thread_id, "x" * 10_000)
+        self.assertEqual(set(saver.storage), {"b", "c"})
+        self.assertLessEqual(saver.memory_bytes(), 70_000)
+
+        # A session larger than the whole budget evicts the others but stays itself
+        run(graph, "c", "z" * 40_000)
+        self.assertEqual(set(saver.storage), {"c"})
+
+    def test_only_the_latest_checkpoints_are_kept(self):
+        saver = BoundedMemorySaver(keep_checkpoints=2)
+        graph = tiny_graph(saver)
+        for value in ["one", "two", "three"]:
+            run(graph, "a", value)
+
+        checkpoints = saver.storage["a"][""]
+        self.assertEqual(len(checkpoints), 2)
+        self.assertTrue(all(key[2] in checkpoints for key in saver.writes if key[0] == "a"))
+        live = set()
+        for saved in checkpoints.values():
+            live.update(saver.serde.loads_typed(saved[0])["channel_versions"].items())
+        self.assertTrue(all((key[2], key[3]) in live for key in saver.blobs if key[0] == "a"))
+        state = graph.get_state({"configurable": {"thread_id": "a"}})
+        self.assertEqual(state.values["value"], "three!")
+
+
+if __name__ == "__main__":
+    unittest.main()
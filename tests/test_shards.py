@@ -0,0 +1,37 @@
+import unittest
+from unittest import mock
+
+from src.shards import parse_era, resolve_era
+
+
+class ResolveEraTest(unittest.TestCase):
+    def setUp(self):
+        # As if only 1861 had been ingested
+        patcher = mock.patch("src.shards.corpus_years", return_value=(1861, 1861))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counts_are_not_years(self):
+        self.assertEqual(resolve_era("Were 1800 troops sent?"), (1861, 1861))
+        self.assertEqual(resolve_era("Did 1862 soldiers desert?"), (1861, 1861))
+
+    def test_years_with_date_context(self):
+        self.assertEqual(resolve_era("What happened in 1865?"), (1865, 1865))
+        self.assertEqual(resolve_era("How did May 4, 1862 go?"), (1862, 1862))
+        self.assertEqual(resolve_era("News from 1861 to 1864"), (1861, 1864))
+        self.assertEqual(resolve_era("1861-1865 battles"), (1861, 1865))
+        self.assertEqual(resolve_era("Fashion in the 1850s"), (1850, 1859))
+
+    def test_bare_years_only_inside_the_corpus(self):
+        self.assertEqual(resolve_era("Was it quiet, 1861?"), (1861, 1861))
+        self.assertEqual(resolve_era("Was it quiet, 1800?"), (1861, 1861))
+
+    def test_explicit_era_wins(self):
+        self.assertEqual(resolve_era("What happened in 1865?", "1860s"), (1860, 1869))
+        self.assertEqual(parse_era("1861-1863"), (1861, 1863))
+        with self.assertRaises(ValueError):
+            parse_era("1865-1861")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from src.single_flight import SingleFlight
+
+
+class FakeRunnable:
+    """Stands in for the graph: counts runs and blocks until released"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def invoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        retriever = (config or {}).get("configurable", {}).get("retriever", "default")
+        return {"response": f"{input['question']} via {retriever}"}
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        self.started.set()
+        await asyncio.sleep(0.2)
+        return {"response": input["question"]}
+
+
+def run_in_threads(target, args_list):
+    results = [None] * len(args_list)
+
+    def run(i, args):
+        results[i] = target(*args)
+
+    threads = [threading.Thread(target=run, args=(i, args)) for i, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_identical_questions_share_one_run(self):
+        runnable = FakeRunnable()
+        flight = SingleFlight(runnable)
+        threads, results = run_in_threads(
+            flight.invoke, [({"question": "How is the war going?"},), ({"question": "how is the war going"},)]
+        )
+        runnable.started.wait(5)
+        time.sleep(0.05)
+        runnable.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(runnable.calls, 1)
+        self.assertEqual(results[0], results[1])
+        self.assertIsNot(results[0], results[1])
+        self.assertEqual(flight.stats(), {"executions": 1, "coalesced": 1})
+
+    def test_different_retrievers_are_not_shared(self):
+        runnable = FakeRunnable()
+        flight = SingleFlight(runnable)
+        question = {"question": "How is the war going?"}
+        threads, results = run_in_threads(
+            flight.invoke,
+            [
+                (question, {"configurable": {"retriever": "bm25"}}),
+                (question, {"configurable": {"retriever": "hybrid"}}),
+            ],
+        )
+        runnable.started.wait(5)
+        time.sleep(0.05)
+        runnable.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(runnable.calls, 2)
+        self.assertEqual(results[0]["response"], "How is the war going? via bm25")
+        self.assertEqual(results[1]["response"], "How is the war going? via hybrid")
+
+    def test_callbacks_do_not_split_runs(self):
+        runnable = FakeRunnable()
+        flight = SingleFlight(runnable)
+        question = {"question": "How is the war going?"}
+        threads, _ = run_in_threads(flight.invoke, [(question, {"callbacks": []}), (question, None)])
+        runnable.started.wait(5)
+        time.sleep(0.05)
+        runnable.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(runnable.calls, 1)
+
+    def test_caller_after_cancellation_starts_fresh_run(self):
+        runnable = FakeRunnable()
+        flight = SingleFlight(runnable)
+        question = {"question": "How is the war going?"}
+
+        async def scenario():
+            first = asyncio.ensure_future(flight.ainvoke(question))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            # Join immediately, before the cancelled task has finished unwinding
+            await asyncio.sleep(0)
+            second = await flight.ainvoke(question)
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+            return second
+
+        result = asyncio.run(scenario())
+        self.assertEqual(result, {"response": "How is the war going?"})
+        self.assertEqual(runnable.calls, 2)
+
+    def test_cancelled_waiter_does_not_cancel_shared_run(self):
+        runnable = FakeRunnable()
+        flight = SingleFlight(runnable)
+        question = {"question": "How is the war going?"}
+
+        async def scenario():
+            first = asyncio.ensure_future(flight.ainvoke(question))
+            second = asyncio.ensure_future(flight.ainvoke(question))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(scenario()), {"response": "How is the war going?"})
+        self.assertEqual(runnable.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()